@@ -1,20 +1,42 @@
-import pickle
 from hashlib import md5
+import json
 import os
+import sys
+from functools import lru_cache
 
-from monte_carlo_lib import MonteCarloLib
-from fast_bpe_sim import calc_ml2p
+from monte_carlo_lib import MonteCarloLib, load_samples
+from resource_lib import load_pickle
+from fast_bpe_sim import calc_ml2p, calc_ml2p_batch, build_candidate_index
 
 current_dir = os.path.dirname(__file__)
-grammars, terminals = pickle.load(open(os.path.join(current_dir, "resources/bpemodel.pickle"), 'rb'))
-converted, not_parsed = pickle.load(open(os.path.join(current_dir, "resources/intermediate_results.pickle"), 'rb'))
-dangerous_chunks = pickle.load(open(os.path.join(current_dir,"resources/dangerous_chunks.pickle"), 'rb'))
-monte_carlo_sample = pickle.load(open(os.path.join(current_dir, "resources/monte_carlo_sample.pickle"), 'rb'))
+grammars, terminals = load_pickle(os.path.join(current_dir, "resources/bpemodel.pickle"))
+converted, not_parsed = load_pickle(os.path.join(current_dir, "resources/intermediate_results.pickle"))
+converted, not_parsed = build_candidate_index(converted, not_parsed)
+dangerous_chunks = frozenset(sys.intern(chunk) for chunk in load_pickle(os.path.join(current_dir,"resources/dangerous_chunks.pickle")))
+monte_carlo_sample = load_samples(os.path.join(current_dir, "resources/monte_carlo_sample.bin"))
 monte_carlo = MonteCarloLib(monte_carlo_sample)
 
+@lru_cache(maxsize=1 << 16)
+def _check_pwd(pwd: str):
+    """Cached strength query of given password, see check_pwd.
+
+    Returns:
+        An immutable tuple of guess_number, segments, chunks and the probability.
+    """
+    struct, prob = calc_ml2p(converted, not_parsed, grammars, terminals, pwd)
+    chunks = []
+    prev = 0
+    for _, l in struct:
+        sc = pwd[prev:prev + l]
+        prev += l
+        chunks.append((sc, sc in dangerous_chunks))
+    rank = monte_carlo.ml2p2rank(prob)
+    return rank, struct, tuple(chunks), 2 ** -prob
+
 def check_pwd(pwd: str):
     """Check the strength of given password.
     Given a password which is encoded by ascii and return strength information of the password.
+    Results of recent queries are cached, see clear_cache.
 
     Arguments:
         pwd: The input password we need to check.
@@ -26,24 +48,39 @@ def check_pwd(pwd: str):
         The chunks indicates that all dangerous chunks in the password.
         The prob is the guess probability of the password which is calculated by monte carlo method.
     """
-    struct, prob = calc_ml2p(converted, not_parsed, grammars, terminals, pwd)
-    chunks = []
-    prev = 0
-    for _, l in struct:
-        sc = pwd[prev:prev + l]
-        prev += l
-        if sc in dangerous_chunks:
-            _a = (sc, True)
-        else:
-            _a = (sc, False)
-        chunks.append(_a)
-    rank = monte_carlo.ml2p2rank(prob)
+    rank, struct, chunks, prob = _check_pwd(pwd)
     return {
         "guess_number": rank,
         "segments": struct,
-        "chunks": chunks,
-        "prob": 2 ** -prob,
+        "chunks": list(chunks),
+        "prob": prob,
     }
 
+def check_pwd_json(pwd: str) -> str:
+    """Same as check_pwd, but the result is serialized into a json string.
+    The string is built from the cached result of check_pwd, see clear_cache.
+    """
+    rank, struct, chunks, prob = _check_pwd(pwd)
+    return json.dumps({"guess_number": rank, "segments": struct, "chunks": chunks, "prob": prob},
+                      separators=(',', ':'))
+
+def check_pwds(pwds):
+    """Check the strength of a batch of passwords.
+    Passwords are grouped by their LUDS structures and checked together, see check_pwd.
+
+    Arguments:
+        pwds: The input passwords we need to check.
+
+    Returns:
+        A list of dicts which consist of guess_number and prob, in the same order as pwds.
+    """
+    results = calc_ml2p_batch(converted, not_parsed, grammars, terminals, pwds)
+    ranks = monte_carlo.ml2p_iter2rank([prob for _, prob in results])
+    return [{"guess_number": rank, "prob": 2 ** -prob} for (_, prob), rank in zip(results, ranks)]
+
+def clear_cache():
+    """Drop all cached results of check_pwd and check_pwd_json."""
+    _check_pwd.cache_clear()
+
 def is_dangerous_chunk(chunk:str):
     return chunk in dangerous_chunks
@@ -1,6 +1,32 @@
 import sys
+from collections import defaultdict
+from itertools import groupby
 from math import log2
-from typing import Any, Tuple
+from typing import Any, List, Tuple
+
+
+def _classify(c: str) -> int:
+    if c.isalpha():
+        if c.isupper():
+            return ord("U")
+        return ord("L")
+    elif c.isdigit():
+        return ord("D")
+    return ord("S")
+
+
+# Translation table which maps every latin-1 byte to its LUDS tag
+_LUDS_TABLE = bytes(_classify(chr(i)) for i in range(256))
+
+
+def luds_tags(pwd: str) -> bytes:
+    """
+    Get the LUDS tag of every character of a password, e.g., b"LSLLLDLL" for "p@ssw0rd".
+    pwd: Password we need to handle.
+
+    return: Bytes which have the same length as the password.
+    """
+    return pwd.encode("latin-1", "replace").translate(_LUDS_TABLE)
 
 
 def luds(pwd: str):
@@ -10,74 +36,112 @@ def luds(pwd: str):
 
     return: A tuple of segment list, which contains a pair of PCFG tag and length of the tag.
     """
-    struct = []
-    prev_tag = ""
-    t_len = 0
-    cur_tag = " "
-    for c in pwd:
-        if c.isalpha():
-            if c.isupper():
-                cur_tag = "U"
-            else:
-                cur_tag = "L"
-        elif c.isdigit():
-            cur_tag = "D"
-        else:
-            cur_tag = "S"
-        if cur_tag == prev_tag:
-            t_len += 1
-        else:
-            if len(prev_tag) > 0:
-                struct.append((prev_tag, t_len))
-            prev_tag = cur_tag
-            t_len = 1
-    struct.append((cur_tag, t_len))
-    return tuple(struct)
+    tags = luds_tags(pwd)
+    if len(tags) == 0:
+        return ((" ", 0),)
+    return tuple((chr(tag), sum(1 for _ in group)) for tag, group in groupby(tags))
+
+
+def build_candidate_index(converted, not_parsed):
+    """
+    Repack the intermediate results of the model for querying.
+    converted: The templates which are converted, keyed by LUDS structure.
+    not_parsed: The templates which are not converted, keyed by password length.
+
+    return: The converted templates keyed by the LUDS tags of a password (see luds_tags)
+        and the not converted templates keyed by length. Templates are stored in tuples.
+    """
+    candidate_index = {}
+    for label, structures in converted.items():
+        key = b"".join(tag.encode("ascii") * t_len for tag, t_len in label)
+        candidate_index[key] = tuple(structures)
+    length_index = {length: tuple(structures) for length, structures in not_parsed.items()}
+    return candidate_index, length_index
+
+
+def _best_candidate(candidate_structures, grammars, terminals, pwd: str, log_max: float):
+    """
+    Find the template with the maximal probability (the minimal minus log probability)
+    among the candidate structures of a password.
+
+    return: The best template and its minus log probability, None and log_max if no template matches.
+    """
+    best_p = log_max
+    best_candidate = None
+    for candidate in candidate_structures:
+        p = grammars.get(candidate, log_max)
+        if p == log_max:
+            break
+        if p >= best_p:
+            continue
+        start = 0
+        # segments of the candidate are the (tag, length) keys of terminals already
+        for segment in candidate:
+            t_len = segment[1]
+            terminal_p = terminals[segment].get(pwd[start:start + t_len])
+            start += t_len
+            if terminal_p is None:
+                p = log_max
+                break
+            p += terminal_p
+            if p >= best_p:
+                break
+        if p < best_p:
+            best_p, best_candidate = p, candidate
+    return best_candidate, best_p
 
 
 def calc_ml2p(__converted, __not_parsed, grammars, terminals, pwd: str) -> Tuple[Any, float]:
     """
     Calculate probability of given password. 
-    converted: The template has already converted.
-    __not_parsed: The templates which are not converted.
+    converted: The template has already converted, see build_candidate_index.
+    __not_parsed: The templates which are not converted, see build_candidate_index.
     grammars: The structures of PCFG model.
     terminals: The segments information of PCFG model.
     pwd: Input password which is a simple string
 
     return: The final template of the password and its maximal probability.
     """
-    get_luds = luds(pwd)
     # get luds structures
-    label = get_luds
-    candidate_structures = __converted.get(label, set())
+    label = luds_tags(pwd)
     log_max = -log2(sys.float_info.min)
+    candidate_structures = __converted.get(label, ())
     if len(candidate_structures) == 0:
-        length = sum([_len for _, _len in label])
-        addon_candidate_structures = __not_parsed.get(length, set())
-        candidate_structures.update(addon_candidate_structures)
+        candidate_structures = __not_parsed.get(len(label), ())
         if len(candidate_structures) == 0:
-            return get_luds, log_max
-    results = []
-    for candidate in candidate_structures:
-        p = grammars.get(candidate, log_max)
-        if p == log_max:
-            break
-        start = 0
-        for tag, t_len in candidate:
-            terminal = terminals.get((tag, t_len))
-            replacement = pwd[start:start + t_len]
-            start += t_len
-            if replacement not in terminal:
-                p = log_max
-                break
+            return luds(pwd), log_max
+    best_candidate, best_p = _best_candidate(candidate_structures, grammars, terminals, pwd, log_max)
+    if best_candidate is None:
+        return luds(pwd), log_max
+    return best_candidate, best_p
+
+
+def calc_ml2p_batch(__converted, __not_parsed, grammars, terminals, pwds: List[str]) -> List[Tuple[Any, float]]:
+    """
+    Calculate probabilities of a batch of passwords, see calc_ml2p.
+    Passwords sharing the same LUDS tags are grouped so that their candidate structures are fetched once.
+    pwds: Input passwords.
+
+    return: The final template and the maximal probability of every password, in the same order as pwds.
+    """
+    log_max = -log2(sys.float_info.min)
+    groups = defaultdict(list)
+    for i, pwd in enumerate(pwds):
+        groups[luds_tags(pwd)].append(i)
+    results = [None] * len(pwds)
+    for label, indices in groups.items():
+        candidate_structures = __converted.get(label, ())
+        if len(candidate_structures) == 0:
+            candidate_structures = __not_parsed.get(len(label), ())
+            if len(candidate_structures) == 0:
+                for i in indices:
+                    results[i] = (luds(pwds[i]), log_max)
+                continue
+        for i in indices:
+            pwd = pwds[i]
+            best_candidate, best_p = _best_candidate(candidate_structures, grammars, terminals, pwd, log_max)
+            if best_candidate is None:
+                results[i] = (luds(pwd), log_max)
             else:
-                p += terminal[replacement]
-        if p < log_max:
-            results.append((candidate, p))
-    if len(results) == 0:
-        min_minus_log_prob = log_max
-        candidate = get_luds
-    else:
-        candidate, min_minus_log_prob = min(results, key=lambda x: x[1])
-        # candidate = [f"{tag}{t_len}" for tag, t_len in candidate]
-    return candidate, min_minus_log_prob
+                results[i] = (best_candidate, best_p)
+    return results
@@ -1,43 +1,34 @@
 import bisect
+import sys
+from array import array
+from itertools import accumulate
 from math import log2, ceil
 import pickle
-from typing import List, Tuple, TextIO
+from typing import Iterable, List, Tuple, TextIO
 import random
 
-def my_cumsum(lst: List[float]):
-    if len(lst) <= 0:
-        return []
-    acc = 0
-    cumsum = []
-    for v in lst:
-        acc += v
-        cumsum.append(acc)
-    return cumsum
-
 def equals(num1:float, num2:float,delta=0.00000001):
     return abs(num1-num2) < delta
 
 class MonteCarloLib:
-    def __init__(self, minus_log_prob_list: List[float]):
-        minus_log_prob_list.sort()
-        self.__minus_log_prob_list = minus_log_prob_list
+    def __init__(self, minus_log_prob_list: Iterable[float]):
+        # sorted copy in a compact float64 buffer, the input may be a list or an array('d')
+        self.__minus_log_prob_list = array('d', sorted(minus_log_prob_list))
         minus_log_probs, positions = self.__gen_rank_from_minus_log_prob()
         self.__minus_log_probs = minus_log_probs
         self.__positions = positions
         self.__gc = None
         pass
 
-    def __gen_rank_from_minus_log_prob(self) -> Tuple[List[float], List[float]]:
+    def __gen_rank_from_minus_log_prob(self) -> Tuple[array, array]:
         """
         calculate the ranks according to Monte Carlo method
         :return: minus_log_probs and corresponding ranks
         """
-        minus_log_probs = [lp for lp in self.__minus_log_prob_list]
-        minus_log_probs.sort()
+        # the list has been sorted in __init__
+        minus_log_probs = self.__minus_log_prob_list
         logn = log2(len(minus_log_probs))
-        positions = my_cumsum([2 ** (mlp - logn) for mlp in minus_log_probs])
-        # logn = log2(len(minus_log_probs))
-        # positions = (2 ** (minus_log_probs - logn)).cumsum()
+        positions = array('d', accumulate(2 ** (mlp - logn) for mlp in minus_log_probs))
         return minus_log_probs, positions
         pass
 
@@ -45,6 +36,21 @@ class MonteCarloLib:
         idx = bisect.bisect_right(self.__minus_log_probs, minus_log_prob)
         return self.__positions[idx - 1] if idx > 0 else 1
 
+    def ml2p_iter2rank(self, minus_log_prob_iter: List[float]) -> List[float]:
+        """
+        batched version of ml2p2rank
+        :param minus_log_prob_iter: minus log probabilities
+        :return: ranks of the minus log probabilities, in the same order
+        """
+        bisect_right = bisect.bisect_right
+        minus_log_probs = self.__minus_log_probs
+        positions = self.__positions
+        ranks = []
+        for mlp in minus_log_prob_iter:
+            idx = bisect_right(minus_log_probs, mlp)
+            ranks.append(positions[idx - 1] if idx > 0 else 1)
+        return ranks
+
     def ml2p_iter2gc(self, minus_log_prob_iter: List[Tuple[str, int, float]],
                      need_resort: bool = False, add1: bool = True) \
             -> List[Tuple[str, float, int, int, int, float]]:
@@ -57,27 +63,29 @@ class MonteCarloLib:
         """
         if need_resort:
             minus_log_prob_iter = sorted(minus_log_prob_iter, key=lambda x: x[2])
-        gc = []
-        prev_rank = 0
-        cracked = 0
-        total = sum([a for _, a, _ in minus_log_prob_iter])
+        # guesses are kept as columns: pwds, mlps, appearances, ranks, cracked and cracked ratios
+        pwds = [pwd for pwd, _, _ in minus_log_prob_iter]
+        appearances = [a for _, a, _ in minus_log_prob_iter]
+        mlps = [mlp for _, _, mlp in minus_log_prob_iter]
+        total = sum(appearances)
         addon = 1 if add1 else 0
-        for pwd, appearance, mlp in minus_log_prob_iter:
-            idx = bisect.bisect_right(self.__minus_log_probs, mlp)
-            rank = ceil(max(self.__positions[idx - 1] if idx > 0 else 1, prev_rank + addon))
-            cracked += appearance
-            prev_rank = rank
-            gc.append((pwd, mlp, appearance, rank, cracked, cracked / total * 100))
-        self.__gc = gc
-        return gc
+        ranks = []
+        prev_rank = 0
+        for mc_rank in self.ml2p_iter2rank(mlps):
+            prev_rank = ceil(max(mc_rank, prev_rank + addon))
+            ranks.append(prev_rank)
+        cracked = list(accumulate(appearances))
+        cracked_ratios = [c / total * 100 for c in cracked]
+        self.__gc = (pwds, mlps, appearances, ranks, cracked, cracked_ratios)
+        return list(zip(*self.__gc))
 
     def write2(self, fd: TextIO):
         if not fd.writable():
             raise Exception(f"{fd.name} is not writable")
         if self.__gc is None:
             raise Exception(f"run mlps2gc before invoke this method")
-        for pwd, mlp, appearance, rank, cracked, cracked_ratio in self.__gc:
-            fd.write(f"{pwd}\t{mlp:.8f}\t{appearance}\t{rank}\t{cracked}\t{cracked_ratio:5.2f}\n")
+        fd.write("".join([f"{pwd}\t{mlp:.8f}\t{appearance}\t{rank}\t{cracked}\t{cracked_ratio:5.2f}\n"
+                          for pwd, mlp, appearance, rank, cracked, cracked_ratio in zip(*self.__gc)]))
         self.__gc = None
         pass
 
@@ -98,6 +106,27 @@ class MonteCarloLib:
             prev_value = self.__minus_log_probs[i]
         return {"positions":positions, "probs":probs}
 
+def save_samples(samples: Iterable[float], path: str):
+    """
+    save minus log probabilities of sampled passwords as raw little-endian float64 values
+    """
+    buffer = array('d', samples)
+    if sys.byteorder == 'big':
+        buffer.byteswap()
+    with open(path, 'wb') as fout:
+        buffer.tofile(fout)
+
+def load_samples(path: str) -> array:
+    """
+    load minus log probabilities of sampled passwords saved by save_samples
+    """
+    buffer = array('d')
+    with open(path, 'rb') as fin:
+        buffer.frombytes(fin.read())
+    if sys.byteorder == 'big':
+        buffer.byteswap()
+    return buffer
+
 def load_monte_carlo(path:str, dropout=0.75):
     samples = []
     with open(path, 'r') as fin:
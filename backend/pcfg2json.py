@@ -7,23 +7,30 @@ import math
 import hashlib
 
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Tuple, Any
 
 def md5_hash_function(segment:str):
-    return hashlib.md5(segment.encode("utf8")).hexdigest()[12:-12]
+    # the same 8 hex chars as hexdigest()[12:-12], which is what hash_funtion in the frontend computes
+    return hashlib.md5(segment.encode("utf8")).digest()[6:10].hex()
 
 def default_hash_function(segment:str):
     return segment
 
-def hash_function(segment:str):
-    return md5_hash_function(segment)
+# the frontend looks segments up by their md5 hash, so the model must be built with the same hash
+hash_function = md5_hash_function
 
 def tuple_to_string(data:Tuple):
-    if len(data) == 0:
-        return ""
-    if type(data[0]) == tuple:
-        return "".join([tuple_to_string(x) for x in data])
-    return "".join([str(x) for x in data])
+    # flatten nested tuples with an explicit stack, items are popped in their original order
+    out = []
+    stack = [data]
+    while stack:
+        x = stack.pop()
+        if type(x) == tuple:
+            stack.extend(reversed(x))
+        else:
+            out.append(str(x))
+    return "".join(out)
 
 def check_path_exists(_path: str):
     if not os.path.exists(_path):
@@ -74,6 +81,15 @@ def read_grammars(gram_path: str):
     return structure_prob_dict
 
 
+def _read_tag_task(task: Tuple[str, str]) -> Dict[str, Dict[str, float]]:
+    """
+    read_tag for a worker process. The defaultdicts are converted to dicts
+    because their lambda factories cannot be pickled back to the parent process.
+    """
+    tag_path, tag = task
+    return {tag_len: dict(segments) for tag_len, segments in read_tag(tag_path, tag).items()}
+
+
 def read_bpe(model_path: str) -> Tuple[Dict[Any, float], Dict[Tuple[str, int], Dict[Any, float]]]:
     """
     :param model_path:
@@ -86,13 +102,12 @@ def read_bpe(model_path: str) -> Tuple[Dict[Any, float], Dict[Tuple[str, int], D
     check_path_exists(model_path)
     _grammars = read_grammars(os.path.join(model_path, "grammar", "structures.txt"))
     _dicts = []
-    lower = read_tag(os.path.join(model_path, "lower"), "L")
-    upper = read_tag(os.path.join(model_path, "upper"), "U")
-    double_m = read_tag(os.path.join(model_path, "mixed_2"), "DM")
-    triple_m = read_tag(os.path.join(model_path, "mixed_3"), "TM")
-    four_m = read_tag(os.path.join(model_path, "mixed_4"), "FM")
-    digits = read_tag(os.path.join(model_path, "digits"), "D")
-    special = read_tag(os.path.join(model_path, "special"), "S")
+    # the tag directories are independent, so they are read in parallel
+    tasks = [("lower", "L"), ("upper", "U"), ("mixed_2", "DM"), ("mixed_3", "TM"), ("mixed_4", "FM"),
+             ("digits", "D"), ("special", "S")]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        lower, upper, double_m, triple_m, four_m, digits, special = executor.map(
+            _read_tag_task, [(os.path.join(model_path, directory), tag) for directory, tag in tasks])
     # _terminals = {**lower, **upper, **double_m, **triple_m, **four_m, **digits, **special}
     _models = {
         "grammar":_grammars, 
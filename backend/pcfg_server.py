@@ -1,46 +1,102 @@
 import argparse
-import pickle
 import socket
 import sys
 import gzip
-from io import BytesIO
 from hashlib import md5
 import json
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from gevent import pywsgi
 
 from monte_carlo_lib import MonteCarloLib
+from resource_lib import load_pickle
+import ckl_pcfg
 
 app = Flask(__name__)
 
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-dangerous_chunks = pickle.load(open("resources/dangerous_chunks.pickle", 'rb'))
-monte_carlo = pickle.load(open("resources/monte_carlo.pickle", 'rb'))
-pcfg_model = json.loads(pickle.load(open("resources/ckl_pcfg_model.pickle", 'rb')))
-encode_dangerous_chunks=[md5(x.encode("utf8")).hexdigest() for x in dangerous_chunks]
-
-def gzip_wrapper(response, compress_level=6):
-    gzip_buffer = BytesIO()
-    gzip_file = gzip.GzipFile(mode='wb', compresslevel=compress_level, fileobj=gzip_buffer)
-    gzip_file.write(response.get_data())
-    gzip_file.close()
-    response.set_data(gzip_buffer.getvalue())
+dangerous_chunks = load_pickle("resources/dangerous_chunks.pickle")
+monte_carlo = load_pickle("resources/monte_carlo.pickle")
+# the model is stored as a json string, so it can be served without decoding
+pcfg_model = load_pickle("resources/ckl_pcfg_model.pickle")
+# truncated md5 digests (8 bytes) of dangerous chunks, the frontend compares the first 16 hex chars
+encode_dangerous_chunks = frozenset(md5(x.encode("utf8")).digest()[:8] for x in dangerous_chunks)
+encode_dangerous_chunks_hex = [x.hex() for x in encode_dangerous_chunks]
+
+# limits of check requests, longer passwords or larger batches are rejected
+MAX_PWD_LEN = 256
+MAX_BATCH_SIZE = 1024
+
+def accept_gzip() -> bool:
+    return request.accept_encodings["gzip"] > 0
+
+def gzip_wrapper(response, compress_level=1):
+    if not accept_gzip():
+        return response
+    data = gzip.compress(response.get_data(), compress_level)
+    response.set_data(data)
     response.headers['Content-Encoding'] = 'gzip'
-    response.headers['Content-Length'] = len(response.get_data())
+    response.headers['Content-Length'] = len(data)
+    response.vary.add('Accept-Encoding')
     return response
 
+class StaticPayload:
+    """An immutable json payload which is encoded and compressed once, see static_response."""
+    def __init__(self, data: str, compress_level=6):
+        self.raw = data.encode("utf8")
+        self.gzipped = gzip.compress(self.raw, compress_level)
+
+def static_response(payload: StaticPayload):
+    headers = {'Vary': 'Accept-Encoding'}
+    if accept_gzip():
+        data = payload.gzipped
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        data = payload.raw
+    headers['Content-Length'] = str(len(data))
+    return Response(data, mimetype='application/json', headers=headers)
+
+def rank_payload():
+    resp = monte_carlo.to_dict()
+    resp["blocklist"] = encode_dangerous_chunks_hex
+    return json.dumps(resp, separators=(',', ':'))
+
+# both payloads never change while the server is running
+pcfg_model_payload = StaticPayload(pcfg_model)
+rank_list_payload = StaticPayload(rank_payload())
+
 @app.route('/pcfgmodel', methods=['get'])
 def model_handler():
-    return gzip_wrapper(jsonify(pcfg_model))
+    return static_response(pcfg_model_payload)
 
 @app.route('/pcfgrank', methods=['get'])
 def rank_handler():
-    resp = monte_carlo.to_dict()
-    resp["blocklist"] = encode_dangerous_chunks
-    return gzip_wrapper(jsonify(resp))
+    return static_response(rank_list_payload)
+
+@app.route('/pcfgcheck', methods=['post'])
+def check_handler():
+    body = request.get_json(silent=True)
+    pwd = body.get("pwd") if isinstance(body, dict) else None
+    if not isinstance(pwd, str):
+        return jsonify({"error": "expect a json object like {\"pwd\": \"password\"}"}), 400
+    if len(pwd) > MAX_PWD_LEN:
+        return jsonify({"error": f"password should have at most {MAX_PWD_LEN} characters"}), 400
+    return gzip_wrapper(Response(ckl_pcfg.check_pwd_json(pwd), mimetype='application/json'))
+
+@app.route('/pcfgcheck_batch', methods=['post'])
+def check_batch_handler():
+    body = request.get_json(silent=True)
+    pwds = body.get("pwds") if isinstance(body, dict) else None
+    if not isinstance(pwds, list) or not all(isinstance(pwd, str) for pwd in pwds):
+        return jsonify({"error": "expect a json object like {\"pwds\": [\"password\", ...]}"}), 400
+    if len(pwds) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"a batch should have at most {MAX_BATCH_SIZE} passwords"}), 400
+    if any(len(pwd) > MAX_PWD_LEN for pwd in pwds):
+        return jsonify({"error": f"password should have at most {MAX_PWD_LEN} characters"}), 400
+    body = json.dumps(ckl_pcfg.check_pwds(pwds), separators=(',', ':'))
+    return gzip_wrapper(Response(body, mimetype='application/json'))
 
 def get_host_ip():
     s = None
@@ -0,0 +1,16 @@
+import mmap
+import pickle
+
+
+def load_pickle(path: str):
+    """
+    Load a pickled resource through a read-only memory map of the file.
+    The file is read from the OS page cache instead of a private buffer,
+    so several server processes loading the same resource share the pages they read.
+    path: Path of the pickle file.
+
+    return: The unpickled object.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return pickle.loads(mm)
@@ -7,11 +7,11 @@ setup(
     author_email="daslab@163.com",
     description="A password strength meter (PSM) with CKL_PCFG model",
     url="https://github.com/snow0011/CKL_PSM", 
-    py_modules=["ckl_pcfg","fast_bpe_sim","monte_carlo_lib"],
+    py_modules=["ckl_pcfg","fast_bpe_sim","monte_carlo_lib","resource_lib"],
     data_files=[("",
         ["resources/bpemodel.pickle",
         "resources/dangerous_chunks.pickle",
-        "resources/monte_carlo_sample.pickle",
+        "resources/monte_carlo_sample.bin",
         "resources/intermediate_results.pickle"]
         )],
     packages=find_packages(),
@@ -22,6 +22,7 @@ The rank list and dangerous chunks for our PCFG password meter.
 probs: the list of minus log probability of sample passwords.
 positions: the guess number of corresponding passwords.
 blocklist: dangerous chunks which imply a password with the chunks is easy to guess. 
+    Every chunk is represented by the first 8 bytes (16 hex chars) of its md5 digest.
 */
 interface RankList{
     positions:number[],
@@ -433,7 +434,7 @@ Check the password chunks whether are dangerous chunks.
 function check_chunks(chunks:string[], block_set:Set<string>):[string,boolean][]{
     let result:[string,boolean][] = [];
     for(let chunk of chunks){
-        const hash_chunk = Md5.hashStr(chunk)
+        const hash_chunk = Md5.hashStr(chunk).substr(0,16);
         result.push([chunk, block_chunks.has(hash_chunk)] );
     }
     return result;
@@ -95,102 +95,60 @@ class DatePwdFilter(PwdFilter):
             return result[0]
         return result
 
+    # date patterns which the whole password should match
+    PATTERNS_ALL = [
+        # YYYYMMDD
+        r'^((19|20)\d{2}0[123456789]0[123456789])$',
+        r'^((19|20)\d{2}0[123456789][12]\d{1})$',
+        r'^((19|20)\d{2}0[123456789]3[01])$',
+        r'^((19|20)\d{2}1[012][0][123456789])$',
+        r'^((19|20)\d{2}1[012][12]\d{1})$',
+        r'^((19|20)\d{2}1[012]3[01])$',
+        # MMDDYYYY
+        r'^(0[123456789]0[123456789](19|20)\d{2})$',
+        r'^(0[123456789][12]\d{1}(19|20)\d{2})$',
+        r'^(0[123456789]3[01](19|20)\d{2})$',
+        r'^(1[012][0][123456789](19|20)\d{2})$',
+        r'^(1[012][12]\d{1}(19|20)\d{2})$',
+        r'^(1[012]3[01](19|20)\d{2})$',
+        # DDMMYYYY
+        r'^(0[123456789]0[123456789](19|20)\d{2})$',
+        r'^([12]\d{1}0[123456789](19|20)\d{2})$',
+        r'^(3[01]0[123456789](19|20)\d{2})$',
+        r'^([0][123456789]1[012](19|20)\d{2})$',
+        r'^([12]\d{1}1[012](19|20)\d{2})$',
+        r'^(3[01]1[012](19|20)\d{2})$',
+        # YYMMDD
+        r'^(19|20)0[123456789]0[123456789]$',
+        r'^(19|20)0[123456789][12]\d{1}$',
+        r'^(19|20)0[123456789]3[01]$',
+        r'^(19|20)1[012][0][123456789]$',
+        r'^(19|20)1[012][12]\d{1}$',
+        r'^(19|20)1[012]3[01]$',
+        # MMDDYY
+        r'^0[123456789]0[123456789](19|20)$',
+        r'^0[123456789][12]\d{1}(19|20)$',
+        r'^0[123456789]3[01](19|20)$',
+        r'^1[012][0][123456789](19|20)$',
+        r'^1[012][12]\d{1}(19|20)$',
+        r'^1[012]3[01](19|20)$',
+        # DDMMYY
+        r'^0[123456789]0[123456789](19|20)$',
+        r'^[12]\d{1}0[123456789](19|20)$',
+        r'^3[01]0[123456789](19|20)$',
+        r'^[0][123456789]1[012](19|20)$',
+        r'^[12]\d{1}1[012](19|20)$',
+        r'^3[01]1[012](19|20)$',
+    ]
+    # all patterns are compiled into one alternation, the i-th pattern is wrapped by group "p{i}"
+    COMBINED_PATTERN = re.compile("|".join(f"(?P<p{i}>{p[1:-1]})" for i, p in enumerate(PATTERNS_ALL)))
+
     def isValid(self, record:Record)->bool:
-        patterns_all = [
-            # YYYYMMDD
-            r'^((19|20)\d{2}0[123456789]0[123456789])$',
-            r'^((19|20)\d{2}0[123456789][12]\d{1})$',
-            r'^((19|20)\d{2}0[123456789]3[01])$',
-            r'^((19|20)\d{2}1[012][0][123456789])$',
-            r'^((19|20)\d{2}1[012][12]\d{1})$',
-            r'^((19|20)\d{2}1[012]3[01])$',
-            # MMDDYYYY
-            r'^(0[123456789]0[123456789](19|20)\d{2})$',
-            r'^(0[123456789][12]\d{1}(19|20)\d{2})$',
-            r'^(0[123456789]3[01](19|20)\d{2})$',
-            r'^(1[012][0][123456789](19|20)\d{2})$',
-            r'^(1[012][12]\d{1}(19|20)\d{2})$',
-            r'^(1[012]3[01](19|20)\d{2})$',
-            # DDMMYYYY
-            r'^(0[123456789]0[123456789](19|20)\d{2})$',
-            r'^([12]\d{1}0[123456789](19|20)\d{2})$',
-            r'^(3[01]0[123456789](19|20)\d{2})$',
-            r'^([0][123456789]1[012](19|20)\d{2})$',
-            r'^([12]\d{1}1[012](19|20)\d{2})$',
-            r'^(3[01]1[012](19|20)\d{2})$',
-            # YYMMDD
-            r'^(19|20)0[123456789]0[123456789]$',
-            r'^(19|20)0[123456789][12]\d{1}$',
-            r'^(19|20)0[123456789]3[01]$',
-            r'^(19|20)1[012][0][123456789]$',
-            r'^(19|20)1[012][12]\d{1}$',
-            r'^(19|20)1[012]3[01]$',
-            # MMDDYY
-            r'^0[123456789]0[123456789](19|20)$',
-            r'^0[123456789][12]\d{1}(19|20)$',
-            r'^0[123456789]3[01](19|20)$',
-            r'^1[012][0][123456789](19|20)$',
-            r'^1[012][12]\d{1}(19|20)$',
-            r'^1[012]3[01](19|20)$',
-            # DDMMYY
-            r'^0[123456789]0[123456789](19|20)$',
-            r'^[12]\d{1}0[123456789](19|20)$',
-            r'^3[01]0[123456789](19|20)$',
-            r'^[0][123456789]1[012](19|20)$',
-            r'^[12]\d{1}1[012](19|20)$',
-            r'^3[01]1[012](19|20)$',
-        ]
-        patterns = [
-            # YYYYMMDD
-            r'((19|20)\d{2}0[123456789]0[123456789])',
-            r'((19|20)\d{2}0[123456789][12]\d{1})',
-            r'((19|20)\d{2}0[123456789]3[01])',
-            r'((19|20)\d{2}1[012][0][123456789])',
-            r'((19|20)\d{2}1[012][12]\d{1})',
-            r'((19|20)\d{2}1[012]3[01])',
-            # MMDDYYYY
-            r'(0[123456789]0[123456789](19|20)\d{2})',
-            r'(0[123456789][12]\d{1}(19|20)\d{2})',
-            r'(0[123456789]3[01](19|20)\d{2})',
-            r'(1[012][0][123456789](19|20)\d{2})',
-            r'(1[012][12]\d{1}(19|20)\d{2})',
-            r'(1[012]3[01](19|20)\d{2})',
-            # DDMMYYYY
-            r'(0[123456789]0[123456789](19|20)\d{2})',
-            r'([12]\d{1}0[123456789](19|20)\d{2})',
-            r'(3[01]0[123456789](19|20)\d{2})',
-            r'([0][123456789]1[012](19|20)\d{2})',
-            r'([12]\d{1}1[012](19|20)\d{2})',
-            r'(3[01]1[012](19|20)\d{2})',
-            # YYMMDD
-            r'\d{2}0[123456789]0[123456789]',
-            r'\d{2}0[123456789][12]\d{1}',
-            r'\d{2}0[123456789]3[01]',
-            r'\d{2}1[012][0][123456789]',
-            r'\d{2}1[012][12]\d{1}',
-            r'\d{2}1[012]3[01]',
-            # MMDDYY
-            r'0[123456789]0[123456789]\d{2}',
-            r'0[123456789][12]\d{1}\d{2}',
-            r'0[123456789]3[01]\d{2}',
-            r'1[012][0][123456789]\d{2}',
-            r'1[012][12]\d{1}\d{2}',
-            r'1[012]3[01]\d{2}',
-            # DDMMYY
-            r'0[123456789]0[123456789]\d{2}',
-            r'[12]\d{1}0[123456789]\d{2}',
-            r'3[01]0[123456789]\d{2}',
-            r'[0][123456789]1[012]\d{2}',
-            r'[12]\d{1}1[012]\d{2}',
-            r'3[01]1[012]\d{2}',
-        ]
         self.total = self.total + record.freq
-        for pattern in patterns_all:
-            s = re.fullmatch(pattern,record.pwd)
-            #ss = re.match(pattern,record.pwd)
-            # for s in ss:
-            if s is None:
-                continue
+        s = self.COMBINED_PATTERN.fullmatch(record.pwd)
+        if s is not None:
+            # the alternatives are tried in order, so lastgroup names the first matched pattern
+            pattern = self.PATTERNS_ALL[int(s.lastgroup[1:])]
             s = s.group()
             if self.block.isNotBlockSegment(s):
                 print(s, "valid",record.pwd,  pattern)
@@ -216,10 +174,12 @@ def main():
     if spliter == '\\t':
         spliter = '\t'
     list = []
+    # each line is stripped and split once
+    lines = (pwd.strip("\r\n").split(spliter) for pwd in args.input)
     if args.freq <= 0:
-        list = [Record(pwd.strip("\r\n").split(spliter)[0]) for pwd in args.input]
+        list = [Record(line[0]) for line in lines]
     else:
-        list = [Record(pwd.strip("\r\n").split(spliter)[0], freq=int(float(pwd.strip("\r\n").split(spliter)[args.freq]))) for pwd in args.input]
+        list = [Record(line[0], freq=int(float(line[args.freq]))) for line in lines]
     f = DatePwdFilter()
     total_pwd = sum([item.freq for item in list])
     result = f.filter(list)
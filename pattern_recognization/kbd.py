@@ -16,56 +16,53 @@
 # If other keyboard layouts are desired they could be added later
 #
 import argparse
-from typing import TextIO
+import re
+from typing import BinaryIO, TextIO
 
 import sys
 from collections import defaultdict
+from multiprocessing import Pool
+from operator import itemgetter
+
+
+# I'm leaving off '`' but it is rarely used in keyboard combos and
+# it makes the code cleaner
+KEYBOARD_ROWS = [
+    (['1', '2', '3', '4', '5', '6', '7', '8', '9', '0', '-', '='],
+     ['!', '@', '#', '$', '%', '^', '&', '*', '(', ')', '_', '+']),
+    (['q', 'w', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p', '[', ']', '\\'],
+     ['Q', 'W', 'E', 'R', 'T', 'Y', 'U', 'I', 'O', 'P', '{', '}', '|']),
+    (['a', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l', ';', '\''],
+     ['A', 'S', 'D', 'F', 'G', 'H', 'J', 'K', 'L', ':', '"']),
+    (['z', 'x', 'c', 'v', 'b', 'n', 'm', ',', '.', '/'],
+     ['Z', 'X', 'C', 'V', 'B', 'N', 'M', '<', '>', '?']),
+]
+
+# Maps every checked key to its position, built once at import
+#
+# The row and column are packed into one small int, row * 16 + column
+KEY_POS = {}
+for _row, (_keys, _shift_keys) in enumerate(KEYBOARD_ROWS):
+    for _column, _key in enumerate(_keys):
+        KEY_POS[_key] = _row * 16 + _column
+    for _column, _key in enumerate(_shift_keys):
+        KEY_POS[_key] = _row * 16 + _column
 
 
+# Returns a (row, column) pair, see KEY_POS for the packed position
+#
 def find_keyboard_row_column(char):
-    # I'm leaving off '`' but it is rarely used in keyboard combos and
-    # it makes the code cleaner
-    row1 = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0', '-', '=']
-    s_row1 = ['!', '@', '#', '$', '%', '^', '&', '*', '(', ')', '_', '+']
-
-    row2 = ['q', 'w', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p', '[', ']', '\\']
-    s_row2 = ['Q', 'W', 'E', 'R', 'T', 'Y', 'U', 'I', 'O', 'P', '{', '}', '|']
-
-    row3 = ['a', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l', ';', '\'']
-    s_row3 = ['A', 'S', 'D', 'F', 'G', 'H', 'J', 'K', 'L', ':', '"']
-
-    row4 = ['z', 'x', 'c', 'v', 'b', 'n', 'm', ',', '.', '/']
-    s_row4 = ['Z', 'X', 'C', 'V', 'B', 'N', 'M', '<', '>', '?']
-
-    if char in row1:
-        return 0, row1.index(char)
-
-    if char in s_row1:
-        return 0, s_row1.index(char)
-
-    if char in row2:
-        return 1, row2.index(char)
-
-    if char in s_row2:
-        return 1, s_row2.index(char)
-
-    if char in row3:
-        return 2, row3.index(char)
-
-    if char in s_row3:
-        return 2, s_row3.index(char)
-
-    if char in row4:
-        return 3, row4.index(char)
-
-    if char in s_row4:
-        return 3, s_row4.index(char)
-
-    # Default value for keys that are not checked + non-ASCII chars
-    return None
+    pos = KEY_POS.get(char)
+    # Default value for keys that are not checked + non-ASCII chars is None
+    if pos is None:
+        return None
+    return divmod(pos, 16)
 
 
-# Finds if a new key is next to the previous key
+# Finds if a new key is next to the previous key, past and current are
+# (row, column) pairs returned by find_keyboard_row_column
+#
+# The parser uses ADJ below, which is built with this function
 #
 def is_next_on_keyboard(past, current):
     # Check to see if either past or current keys are not valid
@@ -99,6 +96,50 @@ def is_next_on_keyboard(past, current):
     return False
 
 
+# A packed position of no key, row 3 has only 10 keys
+NO_KEY = 3 * 16 + 15
+
+
+NO_KEY_BYTE = bytes([NO_KEY])
+
+
+# Maps every latin-1 character to its packed position, or NO_KEY
+POS_TABLE = bytes(KEY_POS.get(chr(i), NO_KEY) for i in range(256))
+
+
+# Every pair of adjacent packed positions, encoded as past * 64 + current
+#
+# Includes the pairs of a key with itself for repeated characters
+ADJ = frozenset(
+    _past * 64 + _current
+    for _past in set(KEY_POS.values())
+    for _current in set(KEY_POS.values())
+    if is_next_on_keyboard(divmod(_past, 16), divmod(_current, 16))
+)
+
+
+# Words that look like keyboard combos, see interesting_keyboard
+#
+# Eventually might want to read in a blacklist from a file vs
+# hardcoding it here
+#
+# TODO: Some of the shorter strings will also cover the longer strings
+#       That is a function of how I'm currently adding into the blacklist
+#       May want to clean this up a bit, though it is useful to record
+#       for future research.
+#
+FALSE_POSITIVE_WORDS = (
+    "drew",
+    "kiki",
+    "fred",
+    "were",
+    "pop",
+)
+
+# All the words above in one pattern, so a combo is searched only once
+FALSE_POSITIVE_RE = re.compile("|".join(map(re.escape, FALSE_POSITIVE_WORDS)))
+
+
 # Filters keyboard walks to try and limit false positives
 #
 # Currently only defining "interesting" keyboard combos as a combo that has
@@ -115,6 +156,8 @@ def is_next_on_keyboard(past, current):
 # but want to disclose that for future coders. May eventually want to add
 # checks for that.
 #
+# The combo can be a string or a list of characters
+#
 def interesting_keyboard(combo):
     # Length check
     if len(combo) < 3:
@@ -140,46 +183,31 @@ def interesting_keyboard(combo):
     if combo[0] == 'y':
         return False
 
-    # Reject words that look like keyboard combos
-    #
-    # Eventually might want to read in a blacklist from a file vs
-    # hardcoding it here
+    # Reject words that look like keyboard combos, see FALSE_POSITIVE_WORDS
     #
-    # TODO: Some of the shorter strings will also cover the longer strings
-    #       That is a function of how I'm currently adding into the blacklist
-    #       May want to clean this up a bit, though it is useful to record
-    #       for future research.
-    #
-    false_positive_words = [
-        "drew",
-        "kiki",
-        "fred",
-        "were",
-        "pop",
-    ]
-    full_lower_word = ''.join(combo).lower()
-
-    for item in false_positive_words:
-        if item in full_lower_word:
-            return False
+    word = combo if isinstance(combo, str) else ''.join(combo)
+    full_lower_word = word.lower()
+
+    if FALSE_POSITIVE_RE.search(full_lower_word) is not None:
+        return False
 
     # Check for complexity requirements
-    alpha = 0
-    special = 0
-    digit = 0
-    for c in combo:
-        if c.isalpha():
-            alpha = 1
-        elif c.isdigit():
-            digit = 1
-        else:
-            special = 1
+    #
+    # Note: only one class of characters is required for now, and every combo
+    # here has at least three characters, so every combo passes
+    return True
 
-    # If it meets all the complexity requirements
-    if (alpha + special + digit) >= 1:
-        return True
 
-    return False
+# Interned masks of keyboard runs, K_TAGS[n] is "Kn"
+K_TAGS = tuple(sys.intern(f"K{i}") for i in range(256))
+
+
+# Finds the mask of a keyboard run of given length
+#
+def k_tag(length):
+    if length < len(K_TAGS):
+        return K_TAGS[length]
+    return "K" + str(length)
 
 
 # Looks for keyboard combinations in the training data for a section
@@ -188,12 +216,12 @@ def interesting_keyboard(combo):
 #
 # Variables:
 #
-#     password: The current section of the password to process
-#               When first called this will be the whole process.
-#               This function calls itself recursively so will then parse
-#               smaller chunks of this password as it goes along
+#     password: The password to process, it is parsed in a single pass
 #
-#     min_keyboard_run: The minimum size of a keyboard run
+#     min_keyboard_run: The minimum size of the first keyboard run. Runs
+#                       after the first found one need at least 5 keys,
+#                       as the remaining part of the password used to be
+#                       parsed again with the default size
 #
 # Returns:
 #    There are two return values:
@@ -208,11 +236,19 @@ def interesting_keyboard(combo):
 #    found_list: A list of every keyboard combo found when parsing password
 #
 def detect_keyboard_walk(password, min_keyboard_run=5):
+    # The password is too short to contain a run
+    if len(password) < min_keyboard_run:
+        return [(password, None)], []
+
     # The keyboard position of the last key processed
-    past_pos = None
+    past_pos = NO_KEY
+
+    # The start of the current keyboard combo, the combo is
+    # password[combo_start:index]
+    combo_start = 0
 
-    # The current keyboard combo
-    cur_combo = []
+    # The start of the part of the password which is not in a section yet
+    section_start = 0
 
     # The current found list
     found_list = []
@@ -220,129 +256,158 @@ def detect_keyboard_walk(password, min_keyboard_run=5):
     # The current section list of parsing
     section_list = []
 
-    # Loop through each character to find the combos
-    for index, x in enumerate(password):
+    # Find the location of every key on the keyboard, with the byte table
+    # of positions for latin-1 passwords
+    #
+    # Keys that are not checked get NO_KEY, which is in no pair of ADJ, so
+    # no None checks are needed
+    try:
+        positions = password.encode("latin-1").translate(POS_TABLE)
+    except UnicodeEncodeError:
+        key_pos = KEY_POS.get
+        positions = bytes([key_pos(x, NO_KEY) for x in password])
+
+    # A run can not cross a key which is not checked, so if no stretch of
+    # checked keys is long enough the loop below can be skipped
+    if max(map(len, positions.split(NO_KEY_BYTE))) < min_keyboard_run:
+        return [(password, None)], []
+    adj = ADJ
 
-        # Find the current location of the key on the keyboard
-        pos = find_keyboard_row_column(x)
+    # Loop through each character to find the combos
+    for index, pos in enumerate(positions):
 
         # Check to see if a run is occuring, (two keys next to each other)
-        is_run = is_next_on_keyboard(past_pos, pos)
-
-        # If it is a run, keep it going!
-        if is_run:
-            cur_combo.append(x)
+        is_run = past_pos * 64 + pos in adj
 
+        # If it is a run, keep it going! The combo grows with the index,
+        # so there is nothing to do
+        #
         # The keyboard run has stopped
-        else:
-            if len(cur_combo) >= min_keyboard_run:
+        if not is_run:
+            if index - combo_start >= min_keyboard_run:
+                combo = password[combo_start:index]
 
                 # Look at saving this keyboard combo
                 #
                 # See if the keyboard combo is interesting enough to save
-                if interesting_keyboard(cur_combo):
+                if interesting_keyboard(combo):
 
                     # Save the results
-                    found_list.append(''.join(cur_combo))
+                    found_list.append(combo)
 
                     # Update base structure mask
                     #
                     # Update any unprocessed sections before the current run
-                    if len(cur_combo) != index:
-                        section_list.append((password[0:index - len(cur_combo)], None))
+                    if combo_start != section_start:
+                        section_list.append((password[section_start:combo_start], None))
 
                     # Update the mask for the current run
-                    section_list.append((''.join(cur_combo), "K" + str(len(cur_combo))))
-
-                    # If not the last section, go recursive and call it with
-                    # what's remaining
-                    if index != (len(password)):
-                        temp_section, temp_found = detect_keyboard_walk(password[index:])
+                    section_list.append((combo, k_tag(len(combo))))
 
-                        # update info if needed
-                        section_list.extend(temp_section)
-                        if temp_found:
-                            found_list.extend(temp_found)
+                    # Keep parsing what's remaining
+                    section_start = index
+                    min_keyboard_run = 5
 
-                        # Now return since we don't want to parse the same data twice
+                    # No run can fit in what's remaining
+                    if len(password) - index < min_keyboard_run:
+                        section_list.append((password[index:], None))
                         return section_list, found_list
 
             # Start a new run
-            cur_combo = [x]
+            combo_start = index
 
         # What was new is now old. Update the previous position
         past_pos = pos
 
     # Update the last run if needed
-    if len(cur_combo) >= min_keyboard_run:
+    if len(password) - combo_start >= min_keyboard_run:
+        combo = password[combo_start:]
 
         # Look at saving this keyboard combo
         #
         # See if the keyboard combo is interesting enough to save
-        if interesting_keyboard(cur_combo):
+        if interesting_keyboard(combo):
 
             # Save the results
-            found_list.append(''.join(cur_combo))
+            found_list.append(combo)
 
             # Update base structure mask
             #
             # Update any unprocessed sections before the current run
-            if len(cur_combo) != len(password):
-                section_list.append((password[0:len(password) - len(cur_combo)], None))
+            if combo_start != section_start:
+                section_list.append((password[section_start:combo_start], None))
 
             # Update the mask for the current run
-            section_list.append((''.join(cur_combo), "K" + str(len(cur_combo))))
+            section_list.append((combo, k_tag(len(combo))))
 
         # Not treating it as a keyboard combo since it is not intersting
         else:
-            section_list.append((password, None))
+            section_list.append((password[section_start:], None))
 
     # No keyboard run found
     else:
-        section_list.append((password, None))
+        section_list.append((password[section_start:], None))
 
     return section_list, found_list
 
 
+# Finds the keyboard combos of a password, the work item of the processes
+# in wrapper
+#
+def find_keyboard_patterns(password):
+    return detect_keyboard_walk(password, 5)[1]
+
+
 def wrapper():
     cli = argparse.ArgumentParser("Keyboard Identification")
-    cli.add_argument("-p", "--pwd-set", dest="pwd_set", type=argparse.FileType('r'), required=True,
+    cli.add_argument("-p", "--pwd-set", dest="pwd_set", type=argparse.FileType('rb'), required=True,
                      help="Given passwords. We will identify keyboard patterns from these passwords.")
-    cli.add_argument("-o", "--output", dest="output", type=argparse.FileType('w'), required=True,
+    cli.add_argument("-o", "--output", dest="output", type=argparse.FileType('w', bufsize=1 << 20), required=True,
                      help="Keyboard patterns identified from given passwords will appear in this file. "
                           "Note that the 4th line is the start of the identified keyboard patterns.")
+    cli.add_argument("--processes", dest="processes", type=int, default=None,
+                     help="Number of processes to identify keyboard patterns, default is the number of CPUs.")
     args = cli.parse_args()
     f_out = args.output  # type: TextIO
     if not f_out.writable():
         print(f"{f_out.name} is not writable", file=sys.stderr)
         sys.exit(-1)
         pass
-    pwd_set = args.pwd_set  # type: TextIO
+    pwd_set = args.pwd_set  # type: BinaryIO
     pwd_dict = defaultdict(int)
-    for pwd in pwd_set:
-        pwd, cnt = pwd.strip("\r\n").split(" ")
-        pwd_dict[pwd] += int(cnt)
+    # Read the whole file at once as bytes and split the count off the end of
+    # each line, only the password is decoded
+    lines = pwd_set.read().split(b"\n")
+    if lines and lines[-1] == b"":
+        lines.pop()
+    for line in lines:
+        pwd, sep, cnt = line.rstrip(b"\r").rpartition(b" ")
+        if not sep:
+            raise ValueError(f"expect a line like 'password count', got {line!r}")
+        pwd_dict[pwd.decode("utf-8")] += int(cnt)
         # print(leet_patterns, mask_lists)
     containing_kbd = 0
     total = sum(pwd_dict.values())
     kbd_dict = defaultdict(int)
-    for pwd, cnt in pwd_dict.items():
-        _, keyboard_patterns = detect_keyboard_walk(pwd)
-        if len(keyboard_patterns) <= 0 or len("".join(keyboard_patterns)) < len(pwd):
-            continue
-        containing_kbd += cnt
-        for kbd_pattern in keyboard_patterns:
-            kbd_dict[kbd_pattern] += cnt
+    # Passwords are independent, so they are parsed in parallel. imap keeps
+    # the order of the results, and so the order of kbd_dict
+    with Pool(processes=args.processes) as pool:
+        results = pool.imap(find_keyboard_patterns, pwd_dict.keys(), chunksize=1024)
+        for (pwd, cnt), keyboard_patterns in zip(pwd_dict.items(), results):
+            if len(keyboard_patterns) <= 0 or len("".join(keyboard_patterns)) < len(pwd):
+                continue
+            containing_kbd += cnt
+            for kbd_pattern in keyboard_patterns:
+                kbd_dict[kbd_pattern] += cnt
     info = f"Containing keyboard patterns: {containing_kbd},\n" \
            f"Total passwords: {total},\n" \
            f"Proportion: {containing_kbd / total * 100:7.4f}\\%"
     print(info)
     print(info, file=f_out)
-    for kbd_pattern, num in sorted(kbd_dict.items(), key=lambda x: x[1], reverse=True):
-        if num > 0:
-            f_out.write(f"{kbd_pattern}\t{num}\t{num / total * 100:7.4f}\n")
-        else:
-            break
+    # Format all patterns first and write them at once
+    f_out.write("".join([f"{kbd_pattern}\t{num}\t{num / total * 100:7.4f}\n"
+                         for kbd_pattern, num in sorted(kbd_dict.items(), key=itemgetter(1), reverse=True)
+                         if num > 0]))
     f_out.flush()
     f_out.close()
     pass
@@ -26,14 +26,17 @@
 #
 import argparse
 import collections
-import copy
 import functools
+import io
+import operator
 import os
 import pickle
 import re
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from array import array
 from math import floor, ceil
-from typing import List, TextIO, Dict, Set, Tuple
+from typing import List, TextIO, Dict, Tuple, Iterable, Optional, FrozenSet
 
 import itertools
 import sys
@@ -47,50 +50,75 @@ because one of multiword should be of length larger than of equal to 4
 """
 
 
+# alpha, digit and other runs of an ascii string
+_ADO_RE = re.compile(r"[A-Za-z]+|[0-9]+|[^A-Za-z0-9]+")
+
+
+def _ado_tag(c):
+    if c.isalpha():
+        return "A"
+    elif c.isdigit():
+        return "D"
+    return "O"
+
+
+# A, D, O tag of every ascii character, a run is tagged by its first character
+_ADO_TAGS = {chr(i): _ado_tag(chr(i)) for i in range(128)}
+
+
+class _LenTags(dict):
+    """
+    tags of alpha sections by length, A_TAGS[5] -> A5
+    a tag is formatted once, later lookups give the same string
+    """
+
+    def __missing__(self, length):
+        tag = self[length] = f"A{length}"
+        return tag
+
+
+A_TAGS = _LenTags()
+
+
+def _is_ascii(string):
+    try:
+        string.encode("ascii")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
 def split_ado(string):
     """
     a replacement for re
     :param string: any string
     :return: alpha, digit, other parts in a list
     """
-    prev_chr_type = None
-    acc = ""
-    parts = []
-    for c in string:
-        if c.isalpha():
-            cur_chr_type = "alpha"
-        elif c.isdigit():
-            cur_chr_type = "digit"
-        else:
-            cur_chr_type = "other"
-        if prev_chr_type is None:
-            acc = c
-        elif prev_chr_type == cur_chr_type:
-            acc += c
-        else:
-            parts.append(acc)
-            acc = c
-        prev_chr_type = cur_chr_type
-    parts.append(acc)
-    return parts
+    if string.isalpha() or not string:
+        return [string]
+    if _is_ascii(string):
+        return _ADO_RE.findall(string)
+    # isalpha and isdigit of non-ascii characters are not expressible by the ascii classes
+    return ["".join(group) for _, group in itertools.groupby(string, _ado_tag)]
+
+
+# Maps every latin-1 character to its upper/lower tag, see get_mask
+_MASK_TABLE = bytes(ord("U") if chr(i).isupper() else ord("L") for i in range(256))
 
 
+@functools.lru_cache(maxsize=1 << 16)
 def get_mask(seg):
     """
     get corresponding upper/lower tag of given seg
     Hello -> ULLLL
+    l33ts recur in most of their cases, so recent masks are cached
     :param seg:
     :return:
     """
-    mask = ""
-    for e in seg:
-        if e.isupper():
-            mask += "U"
-        elif e.islower():
-            mask += "L"
-        else:
-            mask += "L"
-    return mask
+    try:
+        return seg.encode("latin-1").translate(_MASK_TABLE).decode("ascii")
+    except UnicodeEncodeError:
+        return "".join("U" if e.isupper() else "L" for e in seg)
 
 
 def get_ado(word: str):
@@ -100,25 +128,16 @@ def get_ado(word: str):
     :param word:
     :return:
     """
-    prev_chr_type = None
-    acc = ""
+    if not word:
+        return [(word, None, 0)]
+    if word.isalpha():
+        return [(word, "A", len(word))]
+    if _is_ascii(word):
+        return [(part, _ADO_TAGS[part[0]], len(part)) for part in _ADO_RE.findall(word)]
     parts = []
-    for c in word:
-        if c.isalpha():
-            cur_chr_type = "A"
-        elif c.isdigit():
-            cur_chr_type = "D"
-        else:
-            cur_chr_type = "O"
-        if prev_chr_type is None:
-            acc = c
-        elif prev_chr_type == cur_chr_type:
-            acc += c
-        else:
-            parts.append((acc, prev_chr_type, len(acc)))
-            acc = c
-        prev_chr_type = cur_chr_type
-    parts.append((acc, prev_chr_type, len(acc)))
+    for tag, group in itertools.groupby(word, _ado_tag):
+        part = "".join(group)
+        parts.append((part, tag, len(part)))
     return parts
 
 
@@ -157,7 +176,9 @@ class MyMultiWordDetector:
         #
         self.dtree = {"#1": 5}
         self.__min_len_dtree = {}
-        self.lendict = {}
+        # probability of every training word among the words of the same length,
+        # a word determines its length, so one flat dict is enough, see new_lendict
+        self.word_probs = {}
 
         # Trains on an input passwords
 
@@ -192,11 +213,27 @@ class MyMultiWordDetector:
                 self.dtree[part] = 0
             self.dtree[part] += 1
 
+    # Trains on many passwords at once, same as calling train on each of them
+    #
+    # The parts of all passwords are counted by a single Counter, and the counts
+    # are added to the lookup tables afterwards
+    #
+    def train_passwords(self, passwords: Iterable[str]):
+        min_len = self.min_len
+        max_len = self.max_len
+        counter = collections.Counter(itertools.chain.from_iterable(
+            split_ado(pwd.lower()) for pwd in passwords if min_len <= len(pwd) <= max_len))
+        dtree = self.dtree
+        min_len_dtree = self.__min_len_dtree
+        for part, cnt in counter.items():
+            if len(part) < min_len:
+                min_len_dtree[part] = min_len_dtree.get(part, 0) + cnt
+            else:
+                dtree[part] = dtree.get(part, 0) + cnt
+
     def train_file(self, password_list: TextIO):
         password_list.seek(0)
-        for pwd in password_list:
-            pwd = pwd.strip("\r\n")
-            self.train(pwd)
+        self.train_passwords(pwd.strip("\r\n") for pwd in password_list.read().split("\n"))
         self.new_lendict()
         password_list.seek(0)
         pass
@@ -216,98 +253,133 @@ class MyMultiWordDetector:
     def get_count(self, string):
         return self.dtree.get(string.lower(), 0)
 
-    # Recusivly attempts to identify multiword parsing
+    # Attempts to identify multiword parsing
     #
     # Returns
     #    None: If no parsing could be found
     #    [base1, base2, ...] if parsing was found
     #
-    # Starts with the minimum len base word it can find, and then calls itself
-    # recursivly with the rest of the password until one does not return None.
-    # Returns None if no match can be made.
-
+    # Starts with the largest base word it can find, and then looks for a
+    # parsing of the rest of the password until one is found. Returns None if
+    # no match can be made.
+    #
+    # Instead of recursing on the rest of the password, the base words found so
+    # far are kept in a stack of (start, end). The rests that could not be
+    # parsed are remembered, so every one of them is searched only once
     #
     def _identify_multi(self, alpha_string):
+        length = len(alpha_string)
+        min_len = self.min_len
+        threshold = self.threshold
+        get_count = self._get_count
+
+        stack = []
+        failed = set()
+        start = 0
+        # The rest should be at least min_len long
+        max_end = length - min_len
+        while True:
+
+            # Tries to create the largest base word possible
+            for end in range(max_end, start + min_len - 1, -1):
+
+                # If this is a valid base word
+                if get_count(alpha_string[start:end]) >= threshold:
+
+                    # Check to see if the remainder is a valid base word
+                    if get_count(alpha_string[end:]) >= threshold:
+                        # It was, so return the base words as a list
+                        results = [alpha_string[s:e] for s, e in stack]
+                        results.append(alpha_string[start:end])
+                        results.append(alpha_string[end:])
+                        return results
+
+                    # Need to look for a multiword in the remainder
+                    if end not in failed:
+                        stack.append((start, end))
+                        start = end
+                        max_end = length - min_len
+                        break
+            else:
+                # Could not parse out multi-words
+                if not stack:
+                    return None
+                failed.add(start)
+                # Go on with the next shorter base word before it
+                start, end = stack.pop()
+                max_end = end - 1
+
+    # Probability of a parsing found by _best_multi
+    #
+    # The probabilities of the base words of at least min_len are multiplied
+    # in order, stopping once it is lower than 1e-50. Returns the (prob, stopped)
+    # of a parsed prefix after appending part to it
+    #
+    def __next_prob(self, prob, stopped, part):
+        if stopped or len(part) < self.min_len:
+            return prob, stopped
+        prob *= self.word_probs.get(part, .0)
+        return prob, prob < 1e-50
 
-        # Stop looking for multiwords if there is not enough letters left
-        # to create a second base word
-        #
-        max_index = len(alpha_string) - self.min_len
-
-        # Tries to create the largest base word possible
-        #
-        # Subtract 1 to min_len so that we continue through the minimum length
-        for index in range(max_index, self.min_len - 1, -1):
-
-            # If this is a valid base word
-            if self._get_count(alpha_string[0:index]) >= self.threshold:
-
-                # Check to see if the remainder is a valid base word
-                if self._get_count(alpha_string[index:]) >= self.threshold:
-                    # It was, so return the two items as a list
-                    return [alpha_string[0:index], alpha_string[index:]]
-
-                # Need to recursivly look for a multiword in the remainder
-                results = self._identify_multi(alpha_string[index:])
-
-                # If results indicate a parsing for the end of the alpha_string
-                # It was a successful multi_word so return it as a list
-                if results:
-                    results.insert(0, alpha_string[0:index])
-                    return results
-
-        # Could not parse out multi-words
-        return None
-
-    def __calc_prob(self, container: List):
-        prob = 1
-        for part in container:
-            if len(part) < self.min_len:
+    # Finds the most probable multi-word parsing of alpha_string
+    #
+    # A parsing [base1, base2, ..., baseN] (N >= 2) is valid if for every base
+    # word but the last, its count plus the count of all the letters after it
+    # is larger than threshold. Its probability is the product described in
+    # __next_prob, divided by N
+    #
+    # Returns
+    #    None: If no parsing could be found
+    #    [base1, base2, ...] the valid parsing of the largest probability, ties
+    #    are broken by preferring shorter base words from the left
+    #
+    # The parsings are found by dynamic programming over the end of the parsed
+    # prefix, the number of its base words and whether its probability stopped
+    # being multiplied. For each of them the largest probability is kept, all
+    # the probabilities that can be reached from it keep the same order
+    #
+    def _best_multi(self, alpha_string, threshold=0):
+        length = len(alpha_string)
+        get_count = self._get_count
+        next_prob = self.__next_prob
+        suffix_counts = [get_count(alpha_string[end:]) for end in range(length)]
+
+        # best[end] maps (number of base words, stopped) to (prob, split points)
+        best = [{} for _ in range(length)]
+        best[0][(0, False)] = (1, ())
+        for start in range(length):
+            states = best[start]
+            if not states:
                 continue
-            prob *= self.lendict.get(len(part), {}).get(part, .0)
-            if prob < 1e-50:
-                break
-        return container, prob / len(container)
-
-    def _augmented_identify_multi(self, alpha_string, multi_list: List, container: List, target_len: int,
-                                  threshold: int = 0):
-        # Tries to create the largest base word possible
-        #
-        # Subtract 1 to min_len so that we continue through the minimum length
-        for index in range(1, len(alpha_string), 1):
-            multi_container = container
-            left = alpha_string[0:index]
-            left_count = self._get_count(left)
-            right = alpha_string[index:]
-            right_count = self._get_count(right)
-            # If this is a valid base word
-            if left_count + right_count > threshold:
-                multi_container.append(left)
-                # Check to see if the remainder is a valid base word
-                # It was, so return the two items as a list
-                multi_container.append(right)
-                if len("".join(multi_container)) == target_len:
-                    multi_list.append(self.__calc_prob(copy.deepcopy(multi_container)))
-                multi_container.pop()
-                # return multi_container
-
-                # Need to recursivly look for a multiword in the remainder
-
-                self._augmented_identify_multi(right, multi_list, multi_container, target_len, threshold)
-
-                if len("".join(multi_container)) == target_len:
-                    multi_list.append(self.__calc_prob(copy.deepcopy(multi_container)))
-                multi_container.pop()
-
-                # If results indicate a parsing for the end of the alpha_string
-                # It was a successful multi_word so return it as a list
-                # if results:
-                #     results.insert(0, alpha_string[0:index])
-                #     return results
-
-        # Could not parse out multi-words
-        return
-        pass
+            # the base words from start are checked once for all the parsed prefixes ending there
+            for end in range(start + 1, length):
+                left = alpha_string[start:end]
+                if get_count(left) + suffix_counts[end] <= threshold:
+                    continue
+                targets = best[end]
+                for (num, stopped), (prob, splits) in states.items():
+                    n_prob, n_stopped = next_prob(prob, stopped, left)
+                    n_splits = splits + (end,)
+                    key = (num + 1, n_stopped)
+                    cur = targets.get(key)
+                    if cur is None or n_prob > cur[0] or (n_prob == cur[0] and n_splits < cur[1]):
+                        targets[key] = (n_prob, n_splits)
+
+        result = None
+        for start in range(1, length):
+            states = best[start]
+            if not states:
+                continue
+            right = alpha_string[start:]
+            for (num, stopped), (prob, splits) in states.items():
+                n_prob, _ = next_prob(prob, stopped, right)
+                n_prob = n_prob / (num + 1)
+                if result is None or n_prob > result[0] or (n_prob == result[0] and splits < result[1]):
+                    result = (n_prob, splits)
+        if result is None:
+            return None
+        bounds = (0,) + result[1] + (length,)
+        return [alpha_string[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
 
     # Detects if the input is a multi-word and if so, returns the base words
     #
@@ -357,16 +429,14 @@ class MyMultiWordDetector:
         #     return False, [alpha_string]
 
         # May be a multi-word. Need to parse it for possible base strings
-        result = []
-        self._augmented_identify_multi(alpha_string, result, [], len(alpha_string), threshold=threshold)
-        result = sorted(result, key=lambda x: x[1], reverse=True)
+        result = self._best_multi(alpha_string, threshold=threshold)
         # No multiword parsing found
-        if not result:
+        if result is None:
             return False, [alpha_string]
 
         # A multi-word parsing was found
         else:
-            return True, result[0][0]
+            return True, result
 
     def parse_sections(self, sections):
         parsed = []
@@ -378,27 +448,21 @@ class MyMultiWordDetector:
             if tag is not None:
                 parsed.append((sec, tag))
                 continue
-            parts = split_ado(sec)
-            for part in parts:
+            for part, ado, _ in get_ado(sec):
                 is_multi, multi_words = self.parse(part)
-                for t in multi_words:
-                    if t.isalpha():
+                # base words of a part are pieces of it, so they share the tag of the part
+                if ado == "A":
+                    for t in multi_words:
                         lower_t = t.lower()
-                        parsed.append((lower_t, f"A{len(lower_t)}"))
+                        parsed.append((lower_t, A_TAGS[len(lower_t)]))
                         extracted_letters.append(lower_t)
-                        mask = ""
-                        for c in t:
-                            if c.isupper():
-                                mask += "U"
-                            else:
-                                mask += "L"
-                        extracted_mask.append(mask)
-                    elif t.isdigit():
-                        parsed.append((t, f"D{len(t)}"))
-                        extracted_digits.append(t)
-                    else:
-                        parsed.append((t, f"O{len(t)}"))
-                        extracted_specials.append(t)
+                        extracted_mask.append(get_mask(t))
+                elif ado == "D":
+                    parsed.extend([(t, f"D{len(t)}") for t in multi_words])
+                    extracted_digits.extend(multi_words)
+                else:
+                    parsed.extend([(t, f"O{len(t)}") for t in multi_words])
+                    extracted_specials.extend(multi_words)
         return parsed, extracted_letters, extracted_mask, extracted_digits, extracted_specials
         pass
 
@@ -416,7 +480,7 @@ class MyMultiWordDetector:
                     lendict[lk][k] = v / total
             pass
 
-        self.lendict = lendict
+        self.word_probs = {k: v for ks in lendict.values() for k, v in ks.items()}
         pass
 
 
@@ -425,33 +489,40 @@ path_ignore_l33t = os.path.join(os.path.dirname(__file__), "l33t.ignore")
 print(path_ignore_l33t)
 
 
-def load_l33t_found() -> Set[str]:
+def _read_l33t_file(path: str) -> FrozenSet[str]:
+    """
+    one instance per line, or a set pickled by save_l33t_found
+    :param path: path of the file
+    :return: set of instances, empty if the file does not exist
+    """
+    if not os.path.exists(path):
+        return frozenset()
+    with open(path, "rb") as fd:
+        # every pickle protocol since 2 starts with the PROTO opcode
+        if fd.peek(1)[:1] == b"\x80":
+            return frozenset(pickle.load(fd))
+    with open(path, "r", encoding="ascii") as fd:
+        return frozenset(line.strip("\r\n") for line in fd)
+
+
+@functools.lru_cache(maxsize=None)
+def load_l33t_found() -> FrozenSet[str]:
     """
     words in this set will be treated as l33t and will not be parsed again
+    the set is loaded once, later calls give the same set
     :return: set of l33ts
     """
-    if not os.path.exists(path_found_l33t):
-        return set()
-    fd = open(path_found_l33t, "r")
-    l33ts = set()
-    for line in fd:
-        l33ts.add(line.strip("\r\n"))
-    fd.close()
-    return l33ts
+    return _read_l33t_file(path_found_l33t)
 
 
-def load_l33t_ign() -> Set[str]:
+@functools.lru_cache(maxsize=None)
+def load_l33t_ign() -> FrozenSet[str]:
     """
     l33t.ignore, one instance per line
+    the set is loaded once, later calls give the same set
     :return: set of ignored l33ts
     """
-    if not os.path.exists(path_ignore_l33t):
-        return set()
-    fd = open(path_ignore_l33t, "r")
-    ign = set()
-    for line in fd:
-        ign.add(line.strip("\r\n"))
-    return ign
+    return _read_l33t_file(path_ignore_l33t)
 
 
 def save_l33t_found(l33ts: Dict[str, int]) -> None:
@@ -460,19 +531,21 @@ def save_l33t_found(l33ts: Dict[str, int]) -> None:
     :param l33ts: l33ts got
     :return:
     """
-    fd = open(path_found_l33t, "wb")
-    l33ts = set(l33ts.keys())
-    pickle.dump(l33ts, fd)
+    with open(path_found_l33t, "wb") as fd:
+        pickle.dump(set(l33ts.keys()), fd, protocol=pickle.HIGHEST_PROTOCOL)
+    load_l33t_found.cache_clear()
 
 
 # this is a hack
+# a single search for the reject patterns of invalid, the run of i, 1, l, | may be anywhere,
+# the others should match the whole lower word
 re_invalid = re.compile(
-    r"^("
+    r"[i1l|]{3}"  # except il|a, il|b
+    r"|^(?:"
     r".{1,3}"
     r"|[\x21-\x2f\x3a-\x40\x5b-\x60\x7b-\x7e0-9]+[a-z]+"  # except (S or D) + L
     r"|[a-z]+[\x21-\x2f\x3a-\x40\x5b-\x60\x7b-\x7e0-9]+"  # except L + (S or D)
-    r"|.*[i1l|]{3,}.*"  # except il|a, il|b
-    r"|[a-z0-9]{1,2}4(ever|life)"  # except a4ever, b4ever
+    r"|[a-z0-9]{1,2}4(?:ever|life)"  # except a4ever, b4ever
     r")$")
 # ignore words in this set
 ignore_set = load_l33t_ign()
@@ -486,10 +559,11 @@ def limit_alpha(word: str):
     word is not composed of pure alphas
     word should have at last one alpha
     word.isdigit() is a speedup for pure digits
+    any stops at the first alpha, instead of checking every character
     :param word:
     :return:
     """
-    return word.isalpha() or word.isdigit() or all([not c.isalpha() for c in word])
+    return word.isalpha() or word.isdigit() or not any(map(str.isalpha, word))
 
 
 def invalid(word: str):
@@ -510,13 +584,204 @@ def invalid(word: str):
         return True
     if word.startswith("#1") or word.endswith("#1"):
         return True
-    counter = collections.Counter(lower)
+    chars = set(lower)
     # 5i5i5i5i, o00oo0o
-    if 2 == len(counter) or 2 <= len(word) // len(counter) <= min(counter.values()):
+    if 2 == len(chars):
+        return True
+    repeats = len(word) // len(chars)
+    # the counts are only needed if every char may be repeated
+    if repeats >= 2 and repeats <= min(map(lower.count, chars)):
         return True
     return re_invalid.search(lower)
 
 
+# Layout of a node in the flat tries. A node is a row of TRIE_STRIDE C ints: the offsets
+# of the children of every ascii character, the child of other characters, which is
+# never set, and whether the node ends a word. Offsets are the start of rows, the row
+# of the root starts with 0, and 0 means no child since the root is never a child
+TRIE_OTHER = 128
+TRIE_TERMINAL = 129
+TRIE_STRIDE = 130
+# A node without children, tries are array('i') so every entry takes 4 bytes
+TRIE_EMPTY_ROW = array('i', [0]) * TRIE_STRIDE
+
+
+def trie_codes(word: str):
+    """
+    ascii codes of the characters of word, other characters get TRIE_OTHER
+    """
+    try:
+        return word.encode("ascii")
+    except UnicodeEncodeError:
+        return [o if o < TRIE_OTHER else TRIE_OTHER for o in map(ord, word)]
+
+
+def trie_pattern(trie: array, node: int = 0) -> str:
+    """
+    regex of the words below node of a flat trie. Children come before the end of a word,
+    so the greedy match at a position is the longest word starting from there.
+    The root is never the end of a word, so there are no empty matches
+    :param trie: flat trie, see TRIE_STRIDE
+    :param node: offset of the row of the node
+    :return: regex string
+    """
+    branches = [re.escape(chr(c)) + trie_pattern(trie, trie[node + c]) for c in range(TRIE_OTHER) if trie[node + c]]
+    if not branches:
+        # a leaf, or an empty trie which matches nothing
+        return "" if node else "(?!)"
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if node and trie[node + TRIE_TERMINAL]:
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+
+# l33t replacements and the characters they may stand for
+REPLACEMENTS = {
+    '/-\\': ['a'],
+    "/\\": ['a'],
+    "|3": ['b'],
+    "|o": ['b'],
+    "(": ['c', 'g'],
+    "<": ['c'],
+    "k": ['c', 'k'],
+    "s": ['c', 's'],
+    "|)": ['d'],
+    "o|": ["d"],
+    "|>": ['d'],
+    "<|": ["d"],
+    "|=": ['f'],
+    "ph": ['f', 'ph'],
+    "9": ['g'],
+    "|-|": ['h'],
+    "]-[": ['h'],
+    '}-{': ['h'],
+    "(-)": ['h'],
+    ")-(": ['h'],
+    "#": ['h'],
+    "l": ['i', 'l'],
+    "|": ['i', 'l'],
+    "!": ['i'],
+    "][": ['i'],
+    "i": ['l'],
+    "_|": ['j'],
+    "|<": ['k'],
+    "/<": ['k'],
+    "\\<": ['k'],
+    "|{": ['k'],
+    "|_": ['l'],
+    "|v|": ['m'],
+    "/\\/\\": ['m'],
+    "|'|'|": ['m'],
+    "(v)": ['m'],
+    "/\\\\": ['m'],
+    "/|\\": ['m'],
+    '/v\\': ['m'],
+    '|\\|': ['n'],
+    "/\\/": ['n'],
+    "|\\\\|": ['n'],
+    "/|/": ['n'],
+    "()": ['o'],
+    "[]": ['o'],
+    "{}": ['o'],
+    "|2": ['p', 'r'],
+    "|D": ["p"],
+    "(,)": ['q'],
+    "kw": ['q', 'kw'],
+    "|z": ['r'],
+    "|?": ['r'],
+    "+": ['t'],
+    "']['": ['t'],
+    "|_|": ['u'],
+    "|/": ['v'],
+    "\\|": ['v'],
+    "\\/": ['v'],
+    "/": ['v'],
+    "\\/\\/": ['w'],
+    "\\|\\|": ['w'],
+    "|/|/": ['w'],
+    "\\|/": ['w'],
+    "\\^/": ['w'],
+    "//": ['w'],
+    "vv": ['w'],
+    "><": ['x'],
+    "}{": ['x'],
+    "`/": ['y'],
+    "'/": ['y'],
+    "j": ['y', 'j'],
+    "(\\)": ['z'],
+    '@': ['a'],
+    '8': ['b', 'ate'],
+    '3': ['e'],
+    '6': ['b', 'g'],
+    '1': ['i', 'l'],
+    '0': ['o'],
+    # '9': ['q'],
+    '5': ['s'],
+    '7': ['t'],
+    '2': ['z', 'too', 'to'],
+    '4': ['a', 'for', 'fore'],
+    '$': ['s']
+}
+
+
+def _build_repl_dict_tree(replacements):
+    """
+    a dict tree of the replacements, one level per character.
+    the key None of a node holds the options of the replacement ending there,
+    it can not collide with the characters
+    """
+    repl_dict_tree = {}
+    for repl, convs in replacements.items():
+        tmp_d = repl_dict_tree
+        for c in repl:
+            if c not in tmp_d:
+                tmp_d[c] = {}
+            tmp_d = tmp_d[c]
+        tmp_d[None] = tuple(convs)
+    return repl_dict_tree
+
+
+# to speedup match, not necessary
+REPL_DICT_TREE = _build_repl_dict_tree(REPLACEMENTS)
+MAX_LEN_REPL = max(map(len, REPLACEMENTS))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _unleet_options(word: str) -> Optional[Tuple[Tuple[str, ...], ...]]:
+    """
+    the options of every part of word, see AsciiL33tDetector.unleet.
+    the replacements never change, so the options of recently seen words are cached
+    :param word: l33t word
+    :return: options of parts, None if there are 256+ transformations
+    """
+    unleeted = []
+    len_word = len(word)
+    i = 0
+    while i < len_word:
+        # the longest replacement starting from i, found by a single walk down the
+        # dict tree. a character which starts no replacement stands for itself
+        end = i + 1
+        repl_list = (word[i],)
+        node = REPL_DICT_TREE
+        j = i
+        while j < len_word:
+            node = node.get(word[j])
+            if node is None:
+                break
+            j += 1
+            convs = node.get(None)
+            if convs is not None:
+                end = j
+                repl_list = convs
+        i = end
+        unleeted.append(repl_list)
+    all_num = functools.reduce(operator.mul, [len(p) for p in unleeted])
+    # a hack, to early reject
+    if all_num >= 256:
+        return None
+    return tuple(unleeted)
+
+
 class AsciiL33tDetector:
 
     def __init__(self, multi_word_detector):
@@ -526,112 +791,45 @@ class AsciiL33tDetector:
         """
         self.multi_word_detector = multi_word_detector
 
-        self.replacements = {
-            '/-\\': ['a'],
-            "/\\": ['a'],
-            "|3": ['b'],
-            "|o": ['b'],
-            "(": ['c', 'g'],
-            "<": ['c'],
-            "k": ['c', 'k'],
-            "s": ['c', 's'],
-            "|)": ['d'],
-            "o|": ["d"],
-            "|>": ['d'],
-            "<|": ["d"],
-            "|=": ['f'],
-            "ph": ['f', 'ph'],
-            "9": ['g'],
-            "|-|": ['h'],
-            "]-[": ['h'],
-            '}-{': ['h'],
-            "(-)": ['h'],
-            ")-(": ['h'],
-            "#": ['h'],
-            "l": ['i', 'l'],
-            "|": ['i', 'l'],
-            "!": ['i'],
-            "][": ['i'],
-            "i": ['l'],
-            "_|": ['j'],
-            "|<": ['k'],
-            "/<": ['k'],
-            "\\<": ['k'],
-            "|{": ['k'],
-            "|_": ['l'],
-            "|v|": ['m'],
-            "/\\/\\": ['m'],
-            "|'|'|": ['m'],
-            "(v)": ['m'],
-            "/\\\\": ['m'],
-            "/|\\": ['m'],
-            '/v\\': ['m'],
-            '|\\|': ['n'],
-            "/\\/": ['n'],
-            "|\\\\|": ['n'],
-            "/|/": ['n'],
-            "()": ['o'],
-            "[]": ['o'],
-            "{}": ['o'],
-            "|2": ['p', 'r'],
-            "|D": ["p"],
-            "(,)": ['q'],
-            "kw": ['q', 'kw'],
-            "|z": ['r'],
-            "|?": ['r'],
-            "+": ['t'],
-            "']['": ['t'],
-            "|_|": ['u'],
-            "|/": ['v'],
-            "\\|": ['v'],
-            "\\/": ['v'],
-            "/": ['v'],
-            "\\/\\/": ['w'],
-            "\\|\\|": ['w'],
-            "|/|/": ['w'],
-            "\\|/": ['w'],
-            "\\^/": ['w'],
-            "//": ['w'],
-            "vv": ['w'],
-            "><": ['x'],
-            "}{": ['x'],
-            "`/": ['y'],
-            "'/": ['y'],
-            "j": ['y', 'j'],
-            "(\\)": ['z'],
-            '@': ['a'],
-            '8': ['b', 'ate'],
-            '3': ['e'],
-            '6': ['b', 'g'],
-            '1': ['i', 'l'],
-            '0': ['o'],
-            # '9': ['q'],
-            '5': ['s'],
-            '7': ['t'],
-            '2': ['z', 'too', 'to'],
-            '4': ['a', 'for', 'fore'],
-            '$': ['s']
-        }
-        # to speedup match, not necessary
-        repl_dict_tree = {}
-        for repl, convs in self.replacements.items():
-            tmp_d = repl_dict_tree
-            for c in repl:
-                if c not in tmp_d:
-                    tmp_d[c] = {}
-                tmp_d = tmp_d[c]
-            tmp_d["\x02"] = convs
-        self.repl_dict_tree = repl_dict_tree
-        self.max_len_repl = len(max(self.replacements, key=lambda x: len(x)))
+        self.replacements = REPLACEMENTS
+        self.repl_dict_tree = REPL_DICT_TREE
+        self.max_len_repl = MAX_LEN_REPL
         # to speedup query
         self.l33t_map = {}
-        # dict tree, to speedup detection
-        self.dict_l33ts = {}
+        # flat trie of l33ts, to speedup detection, see gen_l33t_dtree
+        self.l33t_trie = array('i', TRIE_EMPTY_ROW)
+        # the trie compiled into a regex, so that extract_l33t runs in the regex engine.
+        # the whole pattern is captured, so that split keeps the l33ts, see extract_l33t
+        self.l33t_re = re.compile(f"({trie_pattern(self.l33t_trie)})")
         # max len of l33t
         self.__min_l33ts = 4
         # min len of l33t
         self.__max_l33ts = 8
         # lower string
+        self.__init_parse_cache()
+
+    def __init_parse_cache(self):
+        # parse results of recent passwords and sections, see parse
+        self.__cached_parse = functools.lru_cache(maxsize=1 << 20)(self.__parse)
+
+    def __getstate__(self):
+        # the cache holds a bound method, it is rebuilt instead of being pickled
+        state = self.__dict__.copy()
+        del state["_AsciiL33tDetector__cached_parse"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__init_parse_cache()
+        # detectors pickled by earlier versions may miss the lengths of l33ts, or the trie
+        # and the regex of l33ts, or have a regex without the group which extract_l33t needs
+        if "_AsciiL33tDetector__min_l33ts" not in state:
+            self.__min_l33ts = min(map(len, self.l33t_map), default=4)
+            self.__max_l33ts = max(map(len, self.l33t_map), default=8)
+        l33t_re = state.get("l33t_re")
+        if l33t_re is None or l33t_re.groups == 0:
+            self.l33t_trie = array('i', TRIE_EMPTY_ROW)
+            self.__build_l33t_trie()
 
     def unleet(self, word: str) -> itertools.product:
         """
@@ -641,32 +839,8 @@ class AsciiL33tDetector:
         :param word: l33t word
         :return: unleeted list
         """
-        unleeted = []
-        repl_dtree = self.repl_dict_tree
-        i = 0
-        while i < len(word):
-            max_m = word[i]
-            if max_m not in repl_dtree:
-                unleeted.append([max_m])
-                i += 1
-                continue
-            add_on = 1
-            for t in range(2, self.max_len_repl + 1):
-
-                n_key = word[i:i + t]
-                if n_key not in self.replacements:
-                    continue
-                max_m = n_key
-                add_on = t
-            if max_m not in self.replacements:
-                repl_list = [max_m]
-            else:
-                repl_list = self.replacements.get(max_m)
-            i += add_on
-            unleeted.append(repl_list)
-        all_num = functools.reduce(lambda x, y: x * y, [len(p) for p in unleeted])
-        # a hack, to early reject
-        if all_num >= 256:
+        unleeted = _unleet_options(word)
+        if unleeted is None:
             return []
         all_possibles = itertools.product(*unleeted)
         return all_possibles
@@ -680,12 +854,16 @@ class AsciiL33tDetector:
         :return: is l33t or not, unleeted word
         """
 
-        unleeted_list = self.unleet(word)
+        options = _unleet_options(word)
+        if options is None:
+            return False, []
+        # an unleeted word should be pure alphas, so the other options are dropped before
+        # the product, instead of checking every transformation
+        options = [[option for option in part if option.isalpha()] for part in options]
         raw_leets = []
-        for unleeted in unleeted_list:
-            # unleeted = "".join(unleeted)
-            if not "".join(unleeted).isalpha():
-                continue
+        # raw words do not depend on the transformation, cache whether they are invalid
+        invalid_raw = {}
+        for unleeted in itertools.product(*options):
             next_i = 0
             for i in range(0, len(unleeted)):
                 if i < next_i:
@@ -693,7 +871,12 @@ class AsciiL33tDetector:
                 for j in range(len(unleeted), i + self.__min_l33ts - 1, -1):
                     substr = "".join(unleeted[i:j])
                     raw_word = word[i:j]
-                    if len(substr) < self.__min_l33ts or invalid(raw_word):
+                    if len(substr) < self.__min_l33ts:
+                        break
+                    is_invalid = invalid_raw.get(raw_word)
+                    if is_invalid is None:
+                        is_invalid = invalid_raw[raw_word] = bool(invalid(raw_word))
+                    if is_invalid:
                         break
                     count = self.multi_word_detector.get_count(substr)
                     if count >= self.multi_word_detector.threshold:
@@ -735,30 +918,38 @@ class AsciiL33tDetector:
             pass
         pass
 
-    def init_l33t(self, training_set, encoding):
+    def init_l33t(self, training_set, encoding, data: Optional[bytes] = None):
         """
         find l33ts from a training set
         :param training_set:
         :param encoding:
+        :param data: content of the training set if it has been read, to avoid reading it again
         :return:
         """
         if encoding.lower() != 'ascii':
             raise Exception("l33t detector can be used in ASCII-encoded passwords")
-        file_input = open(training_set, encoding=encoding)
+        # the training set is read and split at once, instead of line by line
+        if data is None:
+            with open(training_set, "rb") as file_input:
+                data = file_input.read()
         num_parsed_so_far = 0
+        # detect_l33t gives the same l33ts for the same password, so duplicates are skipped
+        seen = set()
         try:
-            password = file_input.readline()
-            password = password.strip("\r\n")
-            while password:
+            # universal newlines, as the lines read in text mode
+            passwords = data.decode(encoding).replace("\r\n", "\n").replace("\r", "\n").split("\n")
+            for password in passwords:
+                # an empty line ends the training set
+                if not password:
+                    break
                 # Print status indicator if needed
                 num_parsed_so_far += 1
                 if num_parsed_so_far % 1000000 == 0:
                     print(str(num_parsed_so_far // 1000000) + ' Million')
                 # pcfg_parser.parse(password)
-                self.detect_l33t(password)
-                # Get the next password
-                password = file_input.readline()
-                password = password.strip("\r\n")
+                if password not in seen:
+                    seen.add(password)
+                    self.detect_l33t(password)
 
         except Exception as msg:
             traceback.print_exc(file=sys.stdout)
@@ -774,7 +965,7 @@ class AsciiL33tDetector:
         generate a dict tree, to speedup detection of part of l33t in a password
         :return:
         """
-        l33ts = sorted(self.l33t_map.keys(), key=lambda x: len(x), reverse=True)
+        l33ts = sorted(self.l33t_map.keys(), key=len, reverse=True)
         if len(l33ts) == 0:
             return
         self.__min_l33ts = len(l33ts[-1])
@@ -797,101 +988,130 @@ class AsciiL33tDetector:
                     del self.l33t_map[l33t]
                     print(f"we delete {l33t} ")
                     break
-        for l33t in self.l33t_map:
-            dict_l33t = self.dict_l33ts
-            for c in l33t:
-                if c not in dict_l33t:
-                    dict_l33t[c] = {}
-                dict_l33t = dict_l33t[c]
-            dict_l33t["\x03"] = True
+        self.__build_l33t_trie()
         pass
 
+    def __build_l33t_trie(self):
+        """
+        build the flat trie and the regex of l33ts in l33t_map
+        the regex is specialized for the l33ts found, so that extract_l33t is a single
+        regex split, and no generic matcher is needed
+        :return:
+        """
+        l33t_trie = self.l33t_trie
+        for l33t in self.l33t_map:
+            codes = trie_codes(l33t)
+            if TRIE_OTHER in codes:
+                # l33ts come from ascii training sets, there is no row for other characters
+                continue
+            node = 0
+            for c in codes:
+                child = l33t_trie[node + c]
+                if child == 0:
+                    child = len(l33t_trie)
+                    l33t_trie[node + c] = child
+                    l33t_trie.extend(TRIE_EMPTY_ROW)
+                node = child
+            l33t_trie[node + TRIE_TERMINAL] = 1
+        self.l33t_re = re.compile(f"({trie_pattern(l33t_trie)})")
+        # l33t_map has changed, the cached results are stale
+        self.__cached_parse.cache_clear()
+
+    def save(self, path: str) -> None:
+        """
+        save the l33ts found, one l33t per line, see load
+        only the l33ts are needed to parse passwords, so the multi-word detector is not saved
+        :param path: path of the file
+        :return:
+        """
+        with open(path, "w", encoding="ascii") as fd:
+            fd.writelines(f"{l33t}\n" for l33t in self.l33t_map)
+
+    @classmethod
+    def load(cls, path: str) -> 'AsciiL33tDetector':
+        """
+        load a detector saved by save, the trie and regex are rebuilt from the l33ts.
+        the loaded detector can parse passwords, but cannot find l33ts from a training set,
+        because it has no multi-word detector.
+        a detector pickled by earlier versions is also accepted
+        :param path: path of the file
+        :return: the detector
+        """
+        with open(path, "rb") as fd:
+            # every pickle protocol since 2 starts with the PROTO opcode
+            if fd.peek(1)[:1] == b"\x80":
+                return pickle.load(fd)
+        leet_detector = cls(multi_word_detector=None)
+        with open(path, "r", encoding="ascii") as fd:
+            # the order of l33ts is kept, as the order of l33t_map
+            leet_detector.l33t_map = dict.fromkeys((line.strip("\r\n") for line in fd), 0)
+        if len(leet_detector.l33t_map) > 0:
+            leet_detector.__min_l33ts = min(map(len, leet_detector.l33t_map))
+            leet_detector.__max_l33ts = max(map(len, leet_detector.l33t_map))
+            leet_detector.__build_l33t_trie()
+        return leet_detector
+
     def extract_l33t(self, pwd) -> List[Tuple[int, int, bool]]:
         """
-        find the longest match of l33t, using DFS
+        find the leftmost longest matches of l33ts
         :param pwd:  password to be identified
-        :return: list of [start_idx, len_of_seg, is_l33t]
+        :return: list of [start_idx, len_of_seg, is_l33t], the segments cover the whole password
+            and are in the order of start_idx, so callers need not sort them
         """
-        l33t_list = []
-        # candidate for a l33t
-        a_l33t = ""
-        # dict tree for l33ts, to speedup
-        dict_l33ts = self.dict_l33ts
-        lower_pwd = pwd.lower()
         len_pwd = len(pwd)
-        i = 0
-        cur_i = i
-        len_l33ted = 0
-        while i < len_pwd and cur_i < len_pwd:
-            c = lower_pwd[cur_i]
-            if c in dict_l33ts:
-                a_l33t += c
-                dict_l33ts = dict_l33ts[c]
-                if "\x03" in dict_l33ts:
-                    add_a_l33t = ""
-                    bak_add_a_l33t = ""
-                    for addi in range(cur_i + 1, min(cur_i + self.__max_l33ts - len(a_l33t) + 1, len_pwd)):
-                        addc = lower_pwd[addi]
-                        if addc not in dict_l33ts:
-                            break
-                        dict_l33ts = dict_l33ts[addc]
-                        add_a_l33t += addc
-                        if "\x03" in dict_l33ts:
-                            bak_add_a_l33t = add_a_l33t
-                        pass
-                    if bak_add_a_l33t != "":
-                        a_l33t += bak_add_a_l33t
-                        cur_i += len(bak_add_a_l33t)
-                    # find a l33t
-                    len_a_l33t = len(a_l33t)
-                    l33t_list.append((cur_i - len_a_l33t + 1, len_a_l33t, True))
-                    # if len_l33ted == pwd_len, return, else, add not_l33t parts
-                    len_l33ted += len_a_l33t
-                    # successfully find a l33t, move forward i
-                    i += len_a_l33t
-                    cur_i = i
-                    # used to find not_l33t
-                    a_l33t = ""
-                    dict_l33ts = self.dict_l33ts
-                cur_i += 1
-            else:
-                i += 1
-                cur_i = i
-                a_l33t = ""
-                dict_l33ts = self.dict_l33ts
-        if len_l33ted == len_pwd:
-            return l33t_list
-        elif len(l33t_list) == 0:
+        if len_pwd < self.__min_l33ts:
+            # shorter than any l33t, no need to run the automaton
+            return [(0, len_pwd, False)] if len_pwd > 0 else []
+        # l33t_re is the trie of l33ts, so one scan finds all the leftmost longest l33ts.
+        # split runs the scan in the regex engine, and gives not_l33t parts and l33ts in turn
+        parts = self.l33t_re.split(pwd.lower())
+        if len(parts) == 1:
             return [(0, len_pwd, False)]
-        else:
-            n_list = set()
-            is_l33t_set = set()
-            n_list.add(0)
-            for i, sl, is_l33t in l33t_list:
-                n_list.add(i)
-                n_list.add(i + sl)
-                is_l33t_set.add(i)
-            n_list.add(len_pwd)
-            n_list = sorted(n_list)
-            n_l33t_list = []
-            for n_i, pwd_i in enumerate(n_list[:-1]):
-                n_l33t_list.append((pwd_i, n_list[n_i + 1] - pwd_i, pwd_i in is_l33t_set))
-            return n_l33t_list
-        pass
+        l33t_list = []
+        start = 0
+        is_l33t = False
+        for part in parts:
+            # not_l33t parts may be empty, e.g., before a l33t at the start or between two l33ts
+            if part:
+                len_part = len(part)
+                l33t_list.append((start, len_part, is_l33t))
+                start += len_part
+            is_l33t = not is_l33t
+        return l33t_list
 
     def parse(self, password):
         """
         parsing a password, may be a section of password
+        results are cached by the password, and the cache is dropped when l33ts are changed
+        :param password:
+        :return: section tag, l33ts, masks
+        """
+        section_list, leet_list, mask_list = self.__cached_parse(password)
+        return list(section_list), list(leet_list), list(mask_list)
+
+    def parse_uncached(self, password):
+        """
+        same as parse, but the result is not cached, for passwords which are parsed only once,
+        e.g., unique passwords sharded across processes
         :param password:
         :return: section tag, l33ts, masks
         """
+        section_list, leet_list, mask_list = self.__parse(password)
+        return list(section_list), list(leet_list), list(mask_list)
+
+    def __parse(self, password):
+        """
+        parsing a password without cache, see parse
+        :param password:
+        :return: section tag, l33ts, masks, as tuples because they are shared by the cache
+        """
         if password in self.l33t_map:
-            return [(password, f"A{len(password)}")], [password], [get_mask(password)]
+            return ((password, A_TAGS[len(password)]),), (password,), (get_mask(password),)
 
+        # the segments of extract_l33t are in order, no need to sort them
         l33t_list = self.extract_l33t(password)
         if len(l33t_list) == 0:
-            return [(password, None)], [], []
-        l33t_list = sorted(l33t_list, key=lambda x: x[0])
+            return ((password, None),), (), ()
         section_list = []
         leet_list = []
         mask_list = []
@@ -899,13 +1119,13 @@ class AsciiL33tDetector:
             leet = password[idx:idx + len_l33t]
             if is_l33t:
                 lower_leet = leet.lower()
-                section_list.append((lower_leet, f"A{len(lower_leet)}"))
+                section_list.append((lower_leet, A_TAGS[len(lower_leet)]))
                 leet_list.append(lower_leet)
                 mask = get_mask(leet)
                 mask_list.append(mask)
             else:
                 section_list.append((leet, None))
-        return section_list, leet_list, mask_list
+        return tuple(section_list), tuple(leet_list), tuple(mask_list)
 
     def parse_sections(self, sections):
         """
@@ -923,7 +1143,8 @@ class AsciiL33tDetector:
             if len(section) < self.__min_l33ts or limit_alpha(section):
                 parsed_sections.append((section, None))
                 continue
-            section_list, leet_list, mask_list = self.parse(section)
+            # the cached tuples are only read here, no need to copy them as parse does
+            section_list, leet_list, mask_list = self.__cached_parse(section)
             parsed_sections.extend(section_list)
             parsed_l33t.extend(leet_list)
             parsed_mask.extend(mask_list)
@@ -932,16 +1153,45 @@ class AsciiL33tDetector:
 
 def obtain_leet_detector(corpus: str) -> AsciiL33tDetector:
     multiword_detector = MyMultiWordDetector()
-    with open(corpus) as fd:
-        for line in fd:
-            line = line.strip("\r\n")
-            multiword_detector.train(line)
+    # the corpus is read once in bulk, and shared by both detectors
+    with open(corpus, "rb") as fd:
+        data = fd.read()
+    # decoded the same way as open(corpus) in text mode
+    multiword_detector.train_passwords(io.TextIOWrapper(io.BytesIO(data)).read().split("\n"))
     leet_detector = AsciiL33tDetector(multi_word_detector=multiword_detector)
-    leet_detector.init_l33t(training_set=corpus, encoding='ascii')
+    leet_detector.init_l33t(training_set=corpus, encoding='ascii', data=data)
     return leet_detector
     pass
 
 
+# the detector of a worker process, see _init_parse_worker
+_worker_detector = None
+
+
+def _init_parse_worker(leet_detector: AsciiL33tDetector):
+    global _worker_detector
+    _worker_detector = leet_detector
+
+
+def _parse_worker(item: Tuple[str, int]) -> Tuple[int, List[str]]:
+    pwd, cnt = item
+    # the passwords are unique, so the parse cache would never hit
+    _, leet_pattern_list, _ = _worker_detector.parse_uncached(pwd)
+    return cnt, leet_pattern_list
+
+
+def _parse_lines(leet_detector: AsciiL33tDetector, lines: Iterable[str]) -> Iterable[Tuple[int, List[str]]]:
+    """
+    parse passwords while reading them, duplicates are served by the parse cache of the detector
+    :param leet_detector:
+    :param lines: one password per line
+    :return: (1, l33ts) per line
+    """
+    for pwd in lines:
+        _, leet_pattern_list, _ = leet_detector.parse(pwd.strip("\r\n"))
+        yield 1, leet_pattern_list
+
+
 def wrapper():
     cli = argparse.ArgumentParser("Leet Identification")
     cli.add_argument("-c", "--corpus", dest="corpus", type=str, required=True,
@@ -953,6 +1203,8 @@ def wrapper():
     cli.add_argument("-o", "--output", dest="output", type=argparse.FileType('w'), required=True,
                      help="Leet patterns identified from given passwords will appear in this file. "
                           "Note that the 4th line is the start of the identified leet patterns.")
+    cli.add_argument("-w", "--workers", dest="workers", type=int, required=False, default=os.cpu_count(),
+                     help="Number of processes to parse the given passwords, default is the number of CPUs.")
     args = cli.parse_args()
     f_out = args.output  # type: TextIO
     if not f_out.writable():
@@ -960,30 +1212,44 @@ def wrapper():
         sys.exit(-1)
     leet_detector = obtain_leet_detector(corpus=args.corpus)
     pwd_set = args.pwd_set  # type: TextIO
-    pwd_dict = collections.defaultdict(int)
-    for pwd in pwd_set:
-        pwd = pwd.strip("\r\n")
-        pwd_dict[pwd] += 1
-        # print(leet_patterns, mask_lists)
     containing_leet = 0
-    total = sum(pwd_dict.values())
-    leet_dict = {**leet_detector.l33t_map}
-    for pwd, cnt in pwd_dict.items():
-        _, leet_pattern_list, mask_list = leet_detector.parse(pwd)
+    total = 0
+    # every l33t starts from zero
+    leet_dict = collections.Counter(dict.fromkeys(leet_detector.l33t_map, 0))
+    if args.workers is None or args.workers <= 1:
+        # counting and parsing are done in a single pass over the lines
+        parsed = _parse_lines(leet_detector, pwd_set)
+        executor = None
+    else:
+        # passwords are parsed independently, so the unique ones are sharded across processes,
+        # and the counts are aggregated here
+        # Counter counts the lines in C
+        pwd_dict = collections.Counter(pwd.strip("\r\n") for pwd in pwd_set)
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_parse_worker,
+                                       initargs=(leet_detector,))
+        parsed = executor.map(_parse_worker, pwd_dict.items(), chunksize=4096)
+    for cnt, leet_pattern_list in parsed:
+        total += cnt
         if len(leet_pattern_list) > 0:
             containing_leet += cnt
         for leet_pattern in leet_pattern_list:
             leet_dict[leet_pattern] += cnt
+    if executor is not None:
+        executor.shutdown()
     info = f"Containing leet patterns: {containing_leet},\n" \
            f"Total passwords: {total},\n" \
            f"Proportion: {containing_leet / total * 100:7.4f}\\%"
     print(info)
     print(info, file=f_out)
-    for leet_pattern, num in sorted(leet_dict.items(), key=lambda x: x[1], reverse=True):
-        if num > 0:
-            f_out.write(f"{leet_pattern}\t{num}\t{num / total * 100:7.4f}\n")
-        else:
-            break
+    # the lines are formatted first and written at once
+    lines = []
+    # only the l33ts found are written, they are picked before sorting,
+    # the sort is stable, so equal counts keep their order
+    found = [item for item in leet_dict.items() if item[1] > 0]
+    found.sort(key=operator.itemgetter(1), reverse=True)
+    for leet_pattern, num in found:
+        lines.append(f"{leet_pattern}\t{num}\t{num / total * 100:7.4f}\n")
+    f_out.writelines(lines)
     f_out.flush()
     f_out.close()
 
@@ -1002,7 +1268,7 @@ def wrapper4chunks():
                      help="Chunks which follow the leet patterns will appear in this file. "
                           "Note that the 4th line is the start of the identified leet patterns.")
     cli.add_argument('-p','--pickle', dest='pickle', type=str, required=False, default=None,
-                     help="read the model from dumped pickle file")
+                     help="read the model from the dumped file, the model is dumped to it first if not exists")
     args = cli.parse_args()
     f_out = args.output  # type: TextIO
     if not f_out.writable():
@@ -1014,31 +1280,26 @@ def wrapper4chunks():
     else:
         if not os.path.exists(dumped):
             leet_detector = obtain_leet_detector(corpus=args.corpus)
-            fd = open(dumped, 'wb')
-            pickle.dump(leet_detector, fd)
-            fd.close()
-        leet_detector = pickle.load(open(dumped, 'rb'))
+            leet_detector.save(dumped)
+        leet_detector = AsciiL33tDetector.load(dumped)
 
     pwd_set = args.chunks  # type: TextIO
-    chunk_dict = collections.defaultdict(int)
+    chunk_dict = collections.Counter()
     for line in pwd_set:
-        line = line.strip("\r\n")
-        chunk, cnt = line.split(' ')
-        chunk = chunk.strip('\x01')
-        chunk_dict[chunk] += int(cnt)
+        chunk, cnt = line.strip("\r\n").split(' ')
+        chunk_dict[chunk.strip('\x01')] += int(cnt)
         # print(leet_patterns, mask_lists)
     containing_leet = 0
     total = sum(chunk_dict.values())
-    leet_dict = {**leet_detector.l33t_map}
-    for valid_leet in valid_set:
-        leet_dict[valid_leet] = 0
+    # only membership is needed, the ignored l33ts are removed at once,
+    # so that one lookup is needed per chunk
+    leet_set = frozenset(leet_detector.l33t_map.keys() | valid_set) - ignore_set
     # if True:
     #     return
-    # print(leet_dict)
-    res = collections.defaultdict(int)
+    # print(leet_set)
+    res = collections.Counter()
     for chunk, cnt in chunk_dict.items():
-        lchunk = chunk.lower()
-        if lchunk in leet_dict and lchunk not in ignore_set:
+        if chunk.lower() in leet_set:
             res[chunk] += cnt
             containing_leet += cnt
             # print(chunk, cnt, leet_dict[chunk])
@@ -1047,11 +1308,15 @@ def wrapper4chunks():
            f"Proportion: {containing_leet / total * 100:7.4f}\\%"
     print(info)
     print(info, file=f_out)
-    for leet_pattern, num in sorted(res.items(), key=lambda x: x[1], reverse=True):
-        if num > 0:
-            f_out.write(f"{leet_pattern}\t{num}\t{num / total * 100:7.4f}\n")
-        else:
-            break
+    # the lines are formatted first and written at once
+    lines = []
+    # only the l33ts found are written, they are picked before sorting,
+    # the sort is stable, so equal counts keep their order
+    found = [item for item in res.items() if item[1] > 0]
+    found.sort(key=operator.itemgetter(1), reverse=True)
+    for leet_pattern, num in found:
+        lines.append(f"{leet_pattern}\t{num}\t{num / total * 100:7.4f}\n")
+    f_out.writelines(lines)
     f_out.flush()
     f_out.close()
 
@@ -10,6 +10,9 @@ from typing import TextIO, Tuple, Callable, List
 import re
 
 class Record:
+    # one record per password, slots save the per-instance dict
+    __slots__ = ("pwd", "pattern", "freq")
+
     def __init__(self, pwd:str, freq:int=1):
         self.pwd = pwd
         self.pattern = ""
@@ -43,7 +46,7 @@ class PwdFilter:
         return True
 
     def filter(self, pwdList:List[Record])->List[Record]:
-        return list(filter(lambda x : self.isValid(x), pwdList))
+        return list(filter(self.isValid, pwdList))
 
     def finish(self, output=sys.stdout):
         output.write("Total password checked: %d\nFilter password number: %d\nmeet pattern password: %d, %5.2f\n" % (self.total, self.filter_number, self.total-self.filter_number, (self.total-self.filter_number)/ self.total * 100))
@@ -53,7 +56,9 @@ class SyllablePwdFilter(PwdFilter):
         super().__init__()
         self.dict = list
         self.letterPettern = re.compile(r'[A-Za-z]+')
-        self.checkList = list(map(lambda s : re.compile('^'+s), ll)) + list(map(lambda s : re.compile(s+'$'), ll))
+        # a password is valid if it fully matches one of the syllables, so all syllables
+        # are compiled into one alternation instead of checking them one by one
+        self.syllablePettern = re.compile('|'.join(map(lambda s : '(?:'+s+')', ll))) if len(ll) > 0 else None
 
     def isValid(self, pwd:Record):
         # subwords = self.letterPettern.findall(pwd.pwd)
@@ -63,12 +68,13 @@ class SyllablePwdFilter(PwdFilter):
         #         if res is not None:
         #             pwd.pattern = res[0]+'<Syllable>'
         #             return True
-        for check in self.checkList:
-            res = check.fullmatch(pwd.pwd)
-            if res is not None:
-                pwd.pattern = res.group()+'<Syllable>'
-                return True
-        return False
+        if self.syllablePettern is None:
+            return False
+        res = self.syllablePettern.fullmatch(pwd.pwd)
+        if res is None:
+            return False
+        pwd.pattern = res.group()+'<Syllable>'
+        return True
 
 
 class PinYinFilter(PwdFilter):
@@ -77,7 +83,33 @@ class PinYinFilter(PwdFilter):
         self.dict = list
         list = filter(lambda x : len(x) > 1, list)
         self.letterPettern = re.compile(r'[A-Za-z]+')
-        self.pinyinPettern = re.compile('^('+'|'.join(list)+')+$')
+        # a password is valid if it can be split into pinyins, see isPinYin
+        self.pinyinSet = frozenset(list)
+        self.pinyinLens = sorted(set(map(len, self.pinyinSet)))
+        # fast rejection, a valid password starts with a pinyin and only has chars of pinyins
+        self.pinyinHeads = frozenset(p[0] for p in self.pinyinSet)
+        self.pinyinChars = frozenset("".join(self.pinyinSet))
+
+    def isPinYin(self, pwd:str)->bool:
+        """
+        whether pwd can be split into one or more pinyins, the same as fullmatching
+        '^(p1|p2|...)+$', but with a word break dp, which never backtracks
+        """
+        n = len(pwd)
+        if n == 0 or pwd[0] not in self.pinyinHeads or not self.pinyinChars.issuperset(pwd):
+            return False
+        # reachable[i] is True if pwd[:i] can be split into pinyins
+        reachable = [False] * (n + 1)
+        reachable[0] = True
+        for i in range(n):
+            if not reachable[i]:
+                continue
+            for l in self.pinyinLens:
+                if i + l > n:
+                    break
+                if pwd[i:i + l] in self.pinyinSet:
+                    reachable[i + l] = True
+        return reachable[n]
 
     def isValid(self, pwd:Record):
         # subwords = self.letterPettern.findall(pwd.pwd)
@@ -86,10 +118,9 @@ class PinYinFilter(PwdFilter):
         #     if res is not None:
         #         pwd.pattern = res[0]+'<PinYin>'
         #         return True
-        res = self.pinyinPettern.fullmatch(pwd.pwd)
-        if res is None:
+        if not self.isPinYin(pwd.pwd):
             return False
-        pwd.pattern = res.group() + '<PinYin>'
+        pwd.pattern = pwd.pwd + '<PinYin>'
         return True
 
 class CombinationPwdFilter(PwdFilter):
@@ -126,10 +157,12 @@ def main():
     if spliter == '\\t':
         spliter = '\t'
     list = []
+    # each line is stripped and split once
+    lines = (pwd.strip("\r\n").split(spliter) for pwd in args.input)
     if args.freq <= 0:
-        list = [Record(pwd.strip("\r\n").split(spliter)[0]) for pwd in args.input]
+        list = [Record(line[0]) for line in lines]
     else:
-        list = [Record(pwd.strip("\r\n").split(spliter)[0], freq=int(float(pwd.strip("\r\n").split(spliter)[args.freq]))) for pwd in args.input]
+        list = [Record(line[0], freq=int(float(line[args.freq]))) for line in lines]
     if args.syllable is None:
         syllables = []
     else: